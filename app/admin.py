@@ -4,7 +4,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
 from app.forms import AdminSignUpForm, AdminCUserEditForm
-from app.models import CafeTable, CoffeeUser, Task, Message, Report
+from app.models import CafeTable, CoffeeUser, Task, TaskOccurrence, \
+                       Message, Report, PointsEntry
 
 
 class CoffeeUserAdmin(UserAdmin):
@@ -34,5 +35,7 @@ class CoffeeUserAdmin(UserAdmin):
 admin.site.register(CafeTable)
 admin.site.register(CoffeeUser, CoffeeUserAdmin)
 admin.site.register(Task)
+admin.site.register(TaskOccurrence)
 admin.site.register(Message)
 admin.site.register(Report)
+admin.site.register(PointsEntry)
@@ -0,0 +1,12 @@
+""" Configuration of the app """
+
+from django.apps import AppConfig
+
+
+class CoffeeCliqueConfig(AppConfig):
+    """ Connects the signal receivers once the app is loaded """
+    name = 'app'
+
+    def ready(self):
+        """ Imports the receivers so that they get registered """
+        import app.signals  # noqa: F401
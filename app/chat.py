@@ -0,0 +1,268 @@
+""" Functions reading and writing the messages of a table, shared by the
+views and the asynchronous consumers """
+
+import datetime
+import pytz
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from app.models import CafeTable, Message
+from app.presence import record_heartbeat
+from app.events import publish
+from app.message_buffer import message_rows, message_data, get_buffer, \
+                               buffer_message, buffer_upvote
+from app.table_members import is_member
+
+# number of older messages sent per page of history
+HISTORY_PAGE_SIZE = 50
+
+
+def table_for_user(user, table):
+    """ Finds a table, making sure the user is part of it
+
+    Args:
+        user::CoffeeUser
+            The user trying to access the table
+        table::int
+            The id of the table
+
+    Returns:
+        table::CafeTable
+            The table, None if it doesn't exist or the user isn't part of it
+    """
+    # make sure user can only access their tables, before loading it
+    try:
+        if not is_member(user, int(table)):
+            return None
+    except ValueError:
+        return None
+    # deal with if the requested table was deleted
+    try:
+        return CafeTable.objects.get(pk=table)
+    except CafeTable.DoesNotExist:
+        return None
+
+
+def read_msgs_cursor(params):
+    """ Reads the cursor sent by the client when polling for new messages
+
+    Args:
+        params::QueryDict
+            The query parameters of the poll
+
+    Returns:
+        since::int
+            The id of the newest message the client already has
+        stamp::datetime
+            The time of the newest upvote the client has seen, None if the
+            client hasn't polled before
+    """
+    try:
+        since = int(params.get('since', 0))
+    except ValueError:
+        since = 0
+    try:
+        stamp = datetime.datetime.fromisoformat(params.get('stamp', ''))
+    except ValueError:
+        return since, None
+    if stamp.tzinfo is not None:
+        # upvote times are stored as naive UTC
+        stamp = stamp.astimezone(pytz.utc).replace(tzinfo=None)
+    return since, stamp
+
+
+def new_msgs_data(user, table, params):
+    """ Finds the messages posted and the upvote counts changed in a specific
+        table since the client last polled it
+
+    Args:
+        user::CoffeeUser
+            The user polling the table
+        table::int
+            The id of the table where the specific messages are written
+        params::QueryDict
+            The query parameters of the poll, holding the cursor returned
+            by the previous poll
+
+    Returns:
+        data::dict
+            The new messages, the changed upvote counts and the cursor to
+            send with the next poll. None if the user can't access the table
+    """
+    table = table_for_user(user, table)
+    if table is None:
+        return None
+
+    # polling counts as the user being in the table
+    record_heartbeat(user, table)
+
+    since, stamp = read_msgs_cursor(params)
+    if stamp is None:
+        # first poll, the counts are sent along with the messages
+        stamp = timezone.now()
+
+    # a quiet table is answered from its buffer without touching the db
+    buffer = get_buffer(table.pk)
+    messages = [msg for msg in buffer['messages'] if msg['id'] > since]
+    counts = {msg['id']: msg['upvotes'] for msg in buffer['messages']}
+    upvotes = {}
+    newest = stamp
+    for msg_id, upvoted in buffer['upvoted'].items():
+        if upvoted > stamp:
+            if msg_id <= since:
+                upvotes[msg_id] = counts[msg_id]
+            newest = max(newest, upvoted)
+    stamp = newest
+
+    if (since and not buffer['complete'] and buffer['messages'] and
+       since < buffer['messages'][0]['id']):
+        # the client is further behind than the buffer goes back
+        messages = missed_messages(table, since)
+
+    if messages:
+        since = messages[-1]['id']
+    return {
+        'messages': messages,
+        'upvotes': upvotes,
+        'since': since,
+        'stamp': stamp.isoformat(),
+    }
+
+
+def missed_messages(table, since):
+    """ Finds the messages posted in a table after a given message, from the
+        database
+
+    Args:
+        table::CafeTable
+            The table where the messages are written
+        since::int
+            The id of the newest message the client already has
+
+    Returns:
+        messages::list
+            Up to 100 messages as formatted by message_data, oldest first
+    """
+    rows = message_rows(table.pk).filter(id__gt=since).order_by('id')[:100]
+    return [message_data(msg) for msg in rows]
+
+
+def read_history_cursor(params):
+    """ Reads the cursor sent by the client when loading older messages
+
+    Args:
+        params::QueryDict
+            The query parameters of the request, 'before' holding the date
+            and 'before_id' the id of the oldest message the client has
+
+    Returns:
+        cursor::tuple
+            The date and id of the oldest message the client has, None to
+            get the newest messages
+    """
+    try:
+        date = datetime.datetime.fromisoformat(params.get('before', ''))
+        msg_id = int(params.get('before_id', ''))
+    except ValueError:
+        return None
+    if date.tzinfo is not None:
+        # dates are stored as naive UTC
+        date = date.astimezone(pytz.utc).replace(tzinfo=None)
+    return date, msg_id
+
+
+def history_page(table, cursor):
+    """ Finds a page of the messages posted in a table before a given message.
+        Seeks from the cursor through the (table_id, message_date, id) index,
+        so every page costs the same however far back it is
+
+    Args:
+        table::CafeTable
+            The table where the messages are written
+        cursor::tuple
+            The date and id of the oldest message the client has, None to
+            get the newest messages
+
+    Returns:
+        data::dict
+            Up to HISTORY_PAGE_SIZE messages as formatted by message_data
+            (oldest first), and whether there are older ones
+    """
+    rows = message_rows(table.pk)
+    if cursor is not None:
+        date, msg_id = cursor
+        # the range lets the index seek to the cursor, the OR only settles
+        # the messages posted at the same time
+        rows = rows.filter(Q(message_date__lt=date) |
+                           Q(message_date=date, id__lt=msg_id),
+                           message_date__lte=date)
+    # one more row than needed tells if there is another page
+    rows = list(rows.order_by('-message_date',
+                              '-id')[:HISTORY_PAGE_SIZE + 1])
+    return {
+        'messages': [message_data(msg) for msg in
+                     reversed(rows[:HISTORY_PAGE_SIZE])],
+        'more': len(rows) > HISTORY_PAGE_SIZE,
+    }
+
+
+def post_message(user, table, content):
+    """ Posts a message in a table and pushes it to everyone listening
+
+    Args:
+        user::CoffeeUser
+            The author of the message
+        table::CafeTable
+            The table the message is posted in
+        content::string
+            The (already validated) content of the message
+
+    Returns:
+        msg::Message
+            The new message
+    """
+    msg = Message.objects.create(
+        table_id=table,
+        created_by=user,
+        message_content=content,
+    )
+    buffer_message(msg)
+    publish(table.pk, 'new_message', message_data(msg))
+    return msg
+
+
+def upvote_message(user, message):
+    """ Upvotes a message if the user hasn't already, and pushes the new
+        count to everyone listening. The unique constraint of the upvotes
+        table rejects a second upvote and the count is incremented by the
+        database, so simultaneous clicks are all counted exactly once
+
+    Args:
+        user::CoffeeUser
+            The user upvoting
+        message::Message
+            The upvoted message, updated with the new count
+
+    Returns:
+        upvoted::bool
+            Whether the upvote was counted, False if the user had already
+            upvoted the message. None if the user isn't part of the
+            message's table
+    """
+    # only the members of the table can upvote its messages
+    if not is_member(user, message.table_id_id):
+        return None
+    upvotes = Message.message_upvote.through.objects
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            upvotes.create(message_id=message.pk, coffeeuser_id=user.pk)
+            Message.objects.filter(pk=message.pk).update(
+                total_upvotes=F('total_upvotes') + 1, last_upvoted=now)
+    except IntegrityError:
+        return False
+    message.refresh_from_db(fields=['total_upvotes', 'last_upvoted'])
+    buffer_upvote(message)
+    publish(message.table_id_id, 'upvote',
+            {'id': message.id, 'upvotes': message.total_upvotes})
+    return True
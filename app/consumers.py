@@ -0,0 +1,256 @@
+""" Asynchronous handlers for requests that stay open until something
+happens in a table. They run under the ASGI application so that waiting
+requests don't hold a worker thread. """
+
+import asyncio
+import json
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.http import QueryDict
+from app.events import table_group
+from app.forms import PostMessageForm
+from app.models import Message
+from app.presence import HEARTBEAT_INTERVAL, record_heartbeat
+from app.chat import new_msgs_data, table_for_user, post_message, \
+                     upvote_message
+
+# seconds a long poll is held for, kept below the usual proxy timeouts
+LONG_POLL_TIMEOUT = 25
+
+
+class OpenHttpConsumer(AsyncHttpConsumer):
+    """ HTTP consumer whose response stays open once handle() returns, so
+    that the table events received afterwards can complete or extend it """
+
+    group = None
+
+    async def http_request(self, message):
+        """ Hands the request to handle() without closing the response """
+        if 'body' in message:
+            self.body.append(message['body'])
+        if not message.get('more_body'):
+            await self.handle(b''.join(self.body))
+
+    async def join_table(self, table_pk):
+        """ Starts receiving the events of a table """
+        self.group = table_group(table_pk)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+
+    async def send_json(self, status, data):
+        """ Sends the whole response as JSON and closes the consumer
+
+        Args:
+            status::int
+                The HTTP status code of the response
+            data::dict
+                The content of the response
+        """
+        await self.send_response(status, json.dumps(data).encode(),
+                                 headers=[(b'Content-Type',
+                                           b'application/json')])
+        await self.disconnect()
+        raise StopConsumer()
+
+    async def disconnect(self):
+        """ Stops receiving the table's events """
+        if self.group is not None:
+            await self.channel_layer.group_discard(self.group,
+                                                   self.channel_name)
+            self.group = None
+
+
+class LongPollConsumer(OpenHttpConsumer):
+    """ Long-polling version of views.get_new_msgs: answers straight away if
+    the table changed since the client's cursor, otherwise waits until
+    something happens in the table or the timeout passes """
+
+    timer = None
+
+    async def handle(self, body):
+        """ Answers the poll if the table changed, or starts waiting
+
+        Args:
+            body::bytes
+                The body of the request (unused)
+        """
+        self.user = self.scope['user']
+        self.table = self.scope['url_route']['kwargs']['table']
+        self.params = QueryDict(self.scope['query_string'])
+        if not self.user.is_authenticated:
+            await self.send_json(403, {'status': 'denied'})
+
+        # join before checking so an event sent in between isn't missed
+        await self.join_table(self.table)
+        data = await database_sync_to_async(new_msgs_data)(
+            self.user, self.table, self.params)
+        if data is None:
+            await self.send_json(403, {'status': 'denied'})
+        if data['messages'] or data['upvotes']:
+            await self.send_json(200, data)
+
+        self.empty = data
+        self.timer = asyncio.ensure_future(self.expire())
+
+    async def expire(self):
+        """ Ends the poll once the timeout has passed """
+        await asyncio.sleep(LONG_POLL_TIMEOUT)
+        await self.channel_layer.send(self.channel_name,
+                                      {'type': 'poll.expired'})
+
+    async def poll_expired(self, event):
+        """ Nothing happened in the table, answers with no changes """
+        await self.send_json(200, self.empty)
+
+    async def table_event(self, event):
+        """ Something happened in the table, answers with the changes """
+        data = await database_sync_to_async(new_msgs_data)(
+            self.user, self.table, self.params)
+        await self.send_json(200, data)
+
+    async def disconnect(self):
+        """ Stops the timer and the table's events """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        await super().disconnect()
+
+
+class TableStreamConsumer(OpenHttpConsumer):
+    """ Server-sent events stream pushing every new message, upvote and task
+    of a table to the client as it happens """
+
+    keep_alive_task = None
+
+    async def handle(self, body):
+        """ Opens the stream if the user can access the table
+
+        Args:
+            body::bytes
+                The body of the request (unused)
+        """
+        self.user = self.scope['user']
+        table_pk = self.scope['url_route']['kwargs']['table']
+        if self.user.is_authenticated:
+            self.table = await database_sync_to_async(table_for_user)(
+                self.user, table_pk)
+        else:
+            self.table = None
+        if self.table is None:
+            await self.send_json(403, {'status': 'denied'})
+
+        await self.join_table(self.table.pk)
+        await self.send_headers(headers=[
+            (b'Content-Type', b'text/event-stream'),
+            (b'Cache-Control', b'no-cache'),
+            (b'X-Accel-Buffering', b'no'),
+        ])
+        # the headers are only sent along with the first part of the body
+        await self.send_body(b'retry: 3000\n\n', more_body=True)
+        self.keep_alive_task = asyncio.ensure_future(self.keep_alive())
+
+    async def keep_alive(self):
+        """ Keeps the connection (and the user's presence in the table) alive
+        while the client listens """
+        while True:
+            await database_sync_to_async(record_heartbeat)(self.user,
+                                                           self.table)
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            await self.send_body(b': keep-alive\n\n', more_body=True)
+
+    async def table_event(self, event):
+        """ Forwards an event of the table to the client """
+        frame = 'event: %s\ndata: %s\n\n' % (event['kind'],
+                                             json.dumps(event['data']))
+        await self.send_body(frame.encode(), more_body=True)
+
+    async def disconnect(self):
+        """ Stops keeping the stream alive and the table's events """
+        if self.keep_alive_task is not None:
+            self.keep_alive_task.cancel()
+            self.keep_alive_task = None
+        await super().disconnect()
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """ WebSocket connection to a table, through which messages are posted
+    and upvoted without reloading the page. The table's events are pushed
+    back through it as well. """
+
+    group = None
+
+    async def connect(self):
+        """ Accepts the connection if the user can access the table """
+        self.user = self.scope['user']
+        table_pk = self.scope['url_route']['kwargs']['table']
+        self.table = None
+        if self.user.is_authenticated:
+            self.table = await database_sync_to_async(table_for_user)(
+                self.user, table_pk)
+        if self.table is None:
+            await self.close()
+            return
+        self.group = table_group(self.table.pk)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        await database_sync_to_async(record_heartbeat)(self.user, self.table)
+
+    async def receive_json(self, content):
+        """ Handles a frame sent by the client: posting a message, upvoting
+        a message or a ping keeping the user in the table
+
+        Args:
+            content::dict
+                The decoded frame, with the action to take
+        """
+        action = content.get('action') if isinstance(content, dict) else None
+        if action == 'post':
+            form = PostMessageForm({'message_content': content.get('content')})
+            if not form.is_valid():
+                await self.send_error('Invalid message')
+                return
+            await database_sync_to_async(post_message)(
+                self.user, self.table,
+                form.cleaned_data.get('message_content'))
+        elif action == 'upvote':
+            if not await database_sync_to_async(self.upvote)(
+                    content.get('id')):
+                await self.send_error('Unknown message')
+        elif action == 'ping':
+            await database_sync_to_async(record_heartbeat)(self.user,
+                                                           self.table)
+        else:
+            await self.send_error('Unknown action')
+
+    def upvote(self, pk):
+        """ Upvotes a message of the table
+
+        Args:
+            pk::int
+                The id of the message
+
+        Returns:
+            found::boolean
+                Whether the message exists in this table and the user can
+                still upvote it
+        """
+        try:
+            message = Message.objects.get(pk=int(pk), table_id=self.table)
+        except (TypeError, ValueError, Message.DoesNotExist):
+            return False
+        return upvote_message(self.user, message) is not None
+
+    async def send_error(self, error):
+        """ Tells the client its frame couldn't be handled """
+        await self.send_json({'kind': 'error', 'data': {'error': error}})
+
+    async def table_event(self, event):
+        """ Forwards an event of the table to the client """
+        await self.send_json({'kind': event['kind'], 'data': event['data']})
+
+    async def disconnect(self, code):
+        """ Stops receiving the table's events """
+        if self.group is not None:
+            await self.channel_layer.group_discard(self.group,
+                                                   self.channel_name)
@@ -0,0 +1,21 @@
+""" Variables added to the context of every template """
+
+from functools import partial
+from app.notifications import unread_count
+
+
+def notifications(request):
+    """ Adds the number of notifications the user hasn't seen, only counted if
+        a template displays it
+
+    Args:
+        request::HttpRequest
+            Object that contains metadata about the request
+
+    Returns:
+        context::dict
+            The unread notifications count, empty for anonymous users
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications': partial(unread_count, request.user)}
@@ -0,0 +1,99 @@
+""" The parts of the dashboard that are read from the database, each cached
+on its own. A cached part is keyed by the versions of what it was built
+from, which the writes changing them bump, so a part is rebuilt as soon as
+it is out of date and a warm dashboard only reads the cache.
+
+The rest of the dashboard is worked out from the user's own row, already
+loaded with the request. """
+
+import datetime
+import hashlib
+from django.core.cache import cache
+from app.leaderboard import WEEK_DAYS, MONTH_DAYS, top_students, \
+                            student_rank, window_leaderboard
+from app.notifications import feed_rows, feed_page
+from app.table_members import member_table_ids
+from app.versions import POINTS, feed_version, read_versions
+
+# seconds a part is cached for, so that renamed users show up eventually
+DASHBOARD_TIMEOUT = 5 * 60
+
+
+def part_key(part, *versions):
+    """ Returns the cache key of a part built from given versions """
+    digest = hashlib.md5(repr(versions).encode()).hexdigest()
+    return 'dashboard:%s:%s' % (part, digest)
+
+
+def cached_leaderboards(university):
+    """ Finds the boards shown on the dashboard of a university
+
+    Args:
+        university::string
+            The university
+
+    Returns:
+        boards::dict
+            The all time board ('users') and the boards of the university
+            over the last week and month, as found in app/leaderboard.py
+    """
+    version, = read_versions([POINTS])
+    # the week and month move on every day
+    key = part_key('leaderboards', university, version,
+                   datetime.date.today())
+    boards = cache.get(key)
+    if boards is None:
+        boards = {
+            'users': top_students(),
+            'weekly_users': window_leaderboard(WEEK_DAYS,
+                                               university=university),
+            'monthly_users': window_leaderboard(MONTH_DAYS,
+                                                university=university),
+        }
+        cache.set(key, boards, DASHBOARD_TIMEOUT)
+    return boards
+
+
+def cached_rank(user):
+    """ Finds the position of a student on the leaderboard
+
+    Args:
+        user::CoffeeUser
+            The student
+
+    Returns:
+        rank::int
+            The student's position, as found by student_rank
+    """
+    version, = read_versions([POINTS])
+    key = part_key('rank', user.pk, user.points, version)
+    position = cache.get(key)
+    if position is None:
+        position = student_rank(user)
+        cache.set(key, position, DASHBOARD_TIMEOUT)
+    return position
+
+
+def cached_notifications(user):
+    """ Finds the first page of the notifications of a user's tables
+
+    Args:
+        user::CoffeeUser
+            The user
+
+    Returns:
+        page::dict
+            The page as formatted by feed_page
+        newest::datetime
+            The date of the newest notification, None if there are none
+    """
+    table_ids = sorted(member_table_ids(user))
+    versions = read_versions([feed_version(table_pk)
+                              for table_pk in table_ids])
+    key = part_key('notifications', table_ids, versions)
+    feed = cache.get(key)
+    if feed is None:
+        rows = feed_rows(user, None)
+        feed = (feed_page(rows), rows[0].date if rows else None)
+        cache.set(key, feed, DASHBOARD_TIMEOUT)
+    return feed
@@ -0,0 +1,105 @@
+""" The users shown on the pages of a table, with only the columns the pages
+display. The members of each table are cached until they change, dropped by
+app/signals.py """
+
+from django.core.cache import cache
+from django.db import transaction
+from app.models import CoffeeUser
+from app.table_members import Membership
+
+# the columns shown for each user
+DIRECTORY_FIELDS = ('id', 'first_name', 'last_name', 'is_staff',
+                    'studying_until')
+# seconds the members of a table are cached for, changes dropping them sooner
+DIRECTORY_TIMEOUT = 60 * 60
+
+
+def directory_key(table_pk):
+    """ Returns the cache key of the members of a table """
+    return 'directory:%d' % table_pk
+
+
+def user_key(user_pk):
+    """ Returns the cache key of a user who isn't a member of the table they
+        are shown in """
+    return 'directory:user:%d' % user_pk
+
+
+def table_directory(table_pk):
+    """ Finds the members of a table
+
+    Args:
+        table_pk::int
+            The id of the table
+
+    Returns:
+        members::list
+            The DIRECTORY_FIELDS of each member, as dicts
+    """
+    key = directory_key(table_pk)
+    members = cache.get(key)
+    if members is None:
+        members = list(CoffeeUser.objects.filter(
+            cafe_table_ids=table_pk).order_by('id').values(*DIRECTORY_FIELDS))
+        cache.set(key, members, DIRECTORY_TIMEOUT)
+    return members
+
+
+def task_creators(tasks):
+    """ Finds the users who set tasks, from the members of the tasks' tables
+        and caching those who aren't members separately
+
+    Args:
+        tasks::iterable
+            The tasks
+
+    Returns:
+        creators::dict
+            The DIRECTORY_FIELDS of each creator, by id
+    """
+    creators = {}
+    for table_pk in {task.table_id_id for task in tasks}:
+        for member in table_directory(table_pk):
+            creators[member['id']] = member
+    missing = {task.created_by_id for task in tasks} - set(creators)
+    if not missing:
+        return creators
+    for user in cache.get_many([user_key(pk) for pk in missing]).values():
+        creators[user['id']] = user
+    missing -= set(creators)
+    if missing:
+        users = list(CoffeeUser.objects.filter(pk__in=missing).values(
+            *DIRECTORY_FIELDS))
+        cache.set_many({user_key(user['id']): user for user in users},
+                       DIRECTORY_TIMEOUT)
+        for user in users:
+            creators[user['id']] = user
+    return creators
+
+
+def forget_directories(table_ids):
+    """ Drops the cached members of tables whose members changed
+
+    Args:
+        table_ids::iterable
+            The ids of the tables
+    """
+    keys = [directory_key(table_pk) for table_pk in table_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # again once committed, so that a read meanwhile can't keep the old ones
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def member_changed(user_pk):
+    """ Drops the cached members of the tables of a user whose shown details
+        changed
+
+    Args:
+        user_pk::int
+            The id of the user
+    """
+    cache.delete(user_key(user_pk))
+    forget_directories(Membership.objects.filter(
+        coffeeuser_id=user_pk).values_list('cafetable_id', flat=True))
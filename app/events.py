@@ -0,0 +1,30 @@
+""" Publishing of the changes made in a table to everyone listening to it.
+Events go through the channel layer, which is in-process by default and can
+be pointed at a broker shared by several workers (see CHANNEL_LAYERS). """
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def table_group(table_pk):
+    """ Returns the name of the group listening to a table """
+    return 'table_%d' % int(table_pk)
+
+
+def publish(table_pk, kind, data):
+    """ Sends an event to everyone listening to a table. Safe to call from
+        the synchronous views.
+
+    Args:
+        table_pk::int
+            The id of the table that changed
+        kind::string
+            What happened, e.g. 'new_message', 'upvote' or 'task'
+        data::dict
+            The JSON serialisable details of what happened
+    """
+    async_to_sync(get_channel_layer().group_send)(table_group(table_pk), {
+        'type': 'table.event',
+        'kind': kind,
+        'data': data,
+    })
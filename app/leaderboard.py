@@ -0,0 +1,185 @@
+""" The leaderboards of the highest scoring students. The top of the all time
+board is read from the (is_staff, points) index and cached until someone's
+points change, and a student's rank is counted from the same index.
+
+The boards of the last week or month, of a university or a table, add up
+daily buckets of the points each student earned in each table. Buckets are
+incremented as points are awarded and the expired ones are dropped daily by
+the compact_leaderboards command, so a board never reads the full points
+history. """
+
+import datetime
+from django.db import transaction
+from django.db.models import F, Sum
+from django.core.cache import cache
+from django.db.models.functions import TruncDate
+from app.models import CoffeeUser, PointsBucket, PointsEntry
+from app.versions import POINTS, bump
+
+# number of students shown on the leaderboard
+LEADERBOARD_SIZE = 10
+# seconds the board is cached for, so that renamed users show up eventually
+LEADERBOARD_TIMEOUT = 5 * 60
+
+LEADERBOARD_KEY = 'leaderboard:top'
+
+# days covered by the weekly and monthly boards
+WEEK_DAYS = 7
+MONTH_DAYS = 30
+
+
+def top_students():
+    """ Finds the highest scoring students
+
+    Returns:
+        students::list
+            The first name, last name and points of the LEADERBOARD_SIZE
+            students with the most points, highest first
+    """
+    students = cache.get(LEADERBOARD_KEY)
+    if students is None:
+        # walks the (is_staff, points) index backwards, the students with
+        # the same points newest first, instead of sorting every student.
+        # is_staff=False would be compiled to NOT is_staff, which can't seek
+        students = list(CoffeeUser.objects.filter(
+            is_staff__in=[False]).order_by('-points', '-pk').values(
+                'pk', 'first_name', 'last_name', 'points')[:LEADERBOARD_SIZE])
+        cache.set(LEADERBOARD_KEY, students, LEADERBOARD_TIMEOUT)
+    return students
+
+
+def student_rank(user):
+    """ Finds the position of a student on the leaderboard, students with the
+        same points sharing a position
+
+    Args:
+        user::CoffeeUser
+            The student
+
+    Returns:
+        rank::int
+            1 for the students with the most points
+    """
+    return CoffeeUser.objects.filter(is_staff__in=[False],
+                                     points__gt=user.points).count() + 1
+
+
+def points_changed():
+    """ Drops the cached board once someone's points changed, and the boards
+        cached under the points version """
+    cache.delete(LEADERBOARD_KEY)
+    bump([POINTS])
+
+
+def window_leaderboard(days, table=None, university=None, today=None):
+    """ Finds the students who earned the most points over the last days
+
+    Args:
+        days::int
+            The number of days covered, today included
+        table::CafeTable
+            Only counts the points earned in this table, if given
+        university::string
+            Only ranks the students of this university, if given
+        today::date
+            The last day covered, today by default
+
+    Returns:
+        students::list
+            The first name, last name and points earned of the
+            LEADERBOARD_SIZE best students, best first
+    """
+    if today is None:
+        today = datetime.date.today()
+    buckets = PointsBucket.objects.filter(
+        day__gt=today - datetime.timedelta(days=days),
+        user__is_staff=False)
+    if table is not None:
+        buckets = buckets.filter(table=table)
+    if university is not None:
+        buckets = buckets.filter(user__university=university)
+    rows = buckets.values('user').annotate(
+        total=Sum('points'), first_name=F('user__first_name'),
+        last_name=F('user__last_name')).order_by(
+            '-total', 'user')[:LEADERBOARD_SIZE]
+    return [{'pk': row['user'], 'first_name': row['first_name'],
+             'last_name': row['last_name'], 'points': row['total']}
+            for row in rows]
+
+
+def add_to_buckets(entries):
+    """ Adds new points entries to the daily buckets of their tables, with
+        one insert and one update for each different number of points
+
+    Args:
+        entries::list
+            The points entries, the ones not earned in a table are skipped
+    """
+    deltas = {}
+    for entry in entries:
+        if entry.table_id is None:
+            continue
+        key = (entry.table_id, entry.date.date(), entry.user_id)
+        deltas[key] = deltas.get(key, 0) + entry.delta
+    if not deltas:
+        return
+    # the buckets that don't exist yet start at 0
+    PointsBucket.objects.bulk_create(
+        [PointsBucket(table_id=table_pk, day=day, user_id=user_pk)
+         for table_pk, day, user_pk in deltas], ignore_conflicts=True)
+    groups = {}
+    for (table_pk, day, user_pk), delta in deltas.items():
+        groups.setdefault((table_pk, day, delta), []).append(user_pk)
+    for (table_pk, day, delta), user_ids in groups.items():
+        PointsBucket.objects.filter(table_id=table_pk, day=day,
+                                    user_id__in=user_ids).update(
+                                        points=F('points') + delta)
+
+
+def rebuild_buckets(first_day, last_day):
+    """ Recomputes the buckets of closed days from the points ledger
+
+    Args:
+        first_day::date
+            The first day recomputed
+        last_day::date
+            The last day recomputed, points can't be awarded on it anymore
+
+    Returns:
+        rebuilt::int
+            The number of buckets recomputed
+    """
+    rows = PointsEntry.objects.filter(
+        date__gte=first_day,
+        date__lt=last_day + datetime.timedelta(days=1),
+        table__isnull=False).annotate(day=TruncDate('date')).values(
+            'table', 'day', 'user').annotate(total=Sum('delta')).order_by()
+    # the boards never see the days missing, nor lose them on a crash
+    with transaction.atomic():
+        PointsBucket.objects.filter(day__gte=first_day,
+                                    day__lte=last_day).delete()
+        buckets = PointsBucket.objects.bulk_create(
+            [PointsBucket(table_id=row['table'], day=row['day'],
+                          user_id=row['user'], points=row['total'])
+             for row in rows], batch_size=500)
+        transaction.on_commit(points_changed)
+    return len(buckets)
+
+
+def compact_buckets(today=None):
+    """ Drops the buckets too old to be on any board
+
+    Args:
+        today::date
+            The current day, today by default
+
+    Returns:
+        dropped::int
+            The number of buckets dropped
+    """
+    if today is None:
+        today = datetime.date.today()
+    dropped, _ = PointsBucket.objects.filter(
+        day__lte=today - datetime.timedelta(days=MONTH_DAYS)).delete()
+    transaction.on_commit(points_changed)
+    return dropped
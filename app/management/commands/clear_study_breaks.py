@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from app.studying import clear_study_breaks
+
+
+class Command(BaseCommand):
+    help = 'clears the study breaks that are over, which are already shown as not studying; run hourly from cron, or keep running with --every'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=0, help='Optional number of seconds between runs, to keep running')
+
+    def handle(self, *args, **options):
+        while True:
+            cleared = clear_study_breaks()
+            self.stdout.write('%d study breaks cleared' % cleared)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,24 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from app.leaderboard import rebuild_buckets, compact_buckets
+
+
+class Command(BaseCommand):
+    help = 'recomputes the leaderboard buckets of the last closed days from the points ledger and drops the expired ones; run daily from cron, or keep running with --every'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1, help='Optional number of closed days to recompute')
+        parser.add_argument('--every', type=int, default=0, help='Optional number of seconds between runs, to keep running')
+
+    def handle(self, *args, **options):
+        while True:
+            today = datetime.date.today()
+            rebuilt = rebuild_buckets(
+                today - datetime.timedelta(days=options['days']),
+                today - datetime.timedelta(days=1))
+            dropped = compact_buckets(today)
+            self.stdout.write('%d buckets rebuilt, %d dropped' % (rebuilt, dropped))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
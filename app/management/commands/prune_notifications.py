@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from app.notifications import prune_notifications
+
+
+class Command(BaseCommand):
+    help = 'deletes the notifications older than NOTIFICATION_DAYS so the notifications table stays bounded; run daily from cron, or keep running with --every'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=0, help='Optional number of seconds between runs, to keep running')
+
+    def handle(self, *args, **options):
+        while True:
+            pruned = prune_notifications()
+            self.stdout.write('%d notifications pruned' % pruned)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from app.points import rebuild_totals
+
+
+class Command(BaseCommand):
+    help = 'recomputes the points of every user from the points ledger'
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_totals()
+        self.stdout.write('%d point totals rebuilt' % rebuilt)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from app.table_members import count_members
+
+
+class Command(BaseCommand):
+    help = 'recounts the members and students of every table, repairing the stored counts'
+
+    def handle(self, *args, **options):
+        recounted = count_members()
+        self.stdout.write('%d tables recounted' % recounted)
@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from app.recurrence import reset_recurring_tasks
+
+
+class Command(BaseCommand):
+    help = 'sets the recurring tasks that are due again; run daily from cron, or keep running with --every'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=0, help='Optional number of seconds between resets, to keep running')
+
+    def handle(self, *args, **options):
+        while True:
+            reset = reset_recurring_tasks()
+            self.stdout.write('%d recurring tasks set again' % reset)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
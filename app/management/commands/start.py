@@ -6,11 +6,15 @@ from django.core.management.base import BaseCommand
 PORT = int(os.environ.get("PORT", 3000))
 
 class Command(BaseCommand):
-    help = 'runs server with gunicorn in a production setting'
+    help = 'runs server with gunicorn and uvicorn workers in a production setting'
 
     def add_arguments(self, parser):
         parser.add_argument('addrport', nargs='?', default='0.0.0.0:' + str(PORT), help='Optional ipaddr:port')
 
     def handle(self, *args, **options):
-        cmd = ['gunicorn', '-b', options['addrport'], 'pythondjangoapp.wsgi']
+        # asynchronous workers, so that long polls can wait without holding
+        # a thread each
+        cmd = ['gunicorn', '-b', options['addrport'],
+               '-k', 'uvicorn.workers.UvicornWorker',
+               'pythondjangoapp.asgi:application']
         subprocess.call(cmd)
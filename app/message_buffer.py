@@ -0,0 +1,209 @@
+""" Per-table buffers holding the latest messages of a table, formatted and
+ready to send, so that reading a table's messages doesn't query the
+database. The buffers live in the 'messages' cache, shared by the workers
+when there are several, which drops the least recently used tables when
+full.
+
+Every write to a table's messages updates its buffer (write-through) and
+bumps the table's version. A buffer whose version is behind missed a
+concurrent write, or another worker's, and is rebuilt from the database. """
+
+import random
+import pytz
+from django.core.cache import caches
+from app.models import Message
+
+# number of messages kept for each table
+BUFFER_SIZE = 100
+
+messages_cache = caches['messages']
+
+
+def buffer_key(table_pk):
+    """ Returns the cache key of a table's buffer """
+    return 'chat:buffer:%d' % table_pk
+
+
+def version_key(table_pk):
+    """ Returns the cache key of a table's version """
+    return 'chat:version:%d' % table_pk
+
+
+def message_rows(table_pk):
+    """ Queries the messages of a table along with their authors, in a single
+        joined query loading only the columns that are displayed
+
+    Args:
+        table_pk::int
+            The id of the table
+
+    Returns:
+        rows::QuerySet
+            The messages of the table, ready to be ordered and sliced
+    """
+    return Message.objects.filter(table_id=table_pk).select_related(
+        'created_by').only('message_date', 'message_content',
+                           'total_upvotes', 'last_upvoted',
+                           'created_by__first_name', 'created_by__last_name')
+
+
+def message_data(msg):
+    """ Formats a message so it can be sent as JSON
+
+    Args:
+        msg::Message
+            The message, with its author loaded
+
+    Returns:
+        data::dict
+            The information displayed for the message
+    """
+    return {
+        'id': msg.id,
+        'first_name': msg.created_by.first_name,
+        'last_name': msg.created_by.last_name,
+        # format the time so it can be converted to the user's timezone in JS
+        'date': pytz.utc.localize(msg.message_date).isoformat(),
+        'content': msg.message_content,
+        'upvotes': msg.total_upvotes,
+    }
+
+
+def bump_version(table_pk):
+    """ Marks that a table's messages changed
+
+    Args:
+        table_pk::int
+            The id of the table
+
+    Returns:
+        version::int
+            The new version of the table
+    """
+    key = version_key(table_pk)
+    # start at a random version, so a buffer that outlived an evicted
+    # version isn't taken as up to date
+    if messages_cache.add(key, random.randint(0, 2 ** 30), None):
+        return messages_cache.get(key)
+    try:
+        return messages_cache.incr(key)
+    except ValueError:
+        # evicted in between
+        version = random.randint(0, 2 ** 30)
+        messages_cache.set(key, version, None)
+        return version
+
+
+def load_buffer(table_pk, version):
+    """ Rebuilds a table's buffer from the database
+
+    Args:
+        table_pk::int
+            The id of the table
+        version::int
+            The version of the table read before querying the database
+
+    Returns:
+        buffer::dict
+            The buffer of the table
+    """
+    rows = message_rows(table_pk).order_by('-id')[:BUFFER_SIZE]
+    rows = list(reversed(rows))
+    buffer = {
+        'version': version,
+        # whether the buffer holds every message of the table
+        'complete': len(rows) < BUFFER_SIZE,
+        'messages': [message_data(msg) for msg in rows],
+        # message id -> when it was last upvoted
+        'upvoted': {msg.id: msg.last_upvoted for msg in rows
+                    if msg.last_upvoted},
+    }
+    messages_cache.set(buffer_key(table_pk), buffer, None)
+    return buffer
+
+
+def get_buffer(table_pk):
+    """ Finds the latest messages of a table, from its buffer if it is up to
+        date or else from the database
+
+    Args:
+        table_pk::int
+            The id of the table
+
+    Returns:
+        buffer::dict
+            'messages' holds the latest messages as formatted by message_data
+            (oldest first), 'upvoted' when they were last upvoted, and
+            'complete' whether they are all of the table's messages
+    """
+    cached = messages_cache.get_many([buffer_key(table_pk),
+                                      version_key(table_pk)])
+    version = cached.get(version_key(table_pk))
+    if version is None:
+        version = bump_version(table_pk)
+    buffer = cached.get(buffer_key(table_pk))
+    if buffer is None or buffer['version'] != version:
+        buffer = load_buffer(table_pk, version)
+    return buffer
+
+
+def write_through(table_pk, change):
+    """ Applies a change to a table's buffer, or drops the buffer if it is
+        behind so that it is rebuilt on the next read
+
+    Args:
+        table_pk::int
+            The id of the table
+        change::function
+            Changes the buffer in place
+    """
+    version = bump_version(table_pk)
+    buffer = messages_cache.get(buffer_key(table_pk))
+    if buffer is None:
+        return
+    if buffer['version'] != version - 1:
+        messages_cache.delete(buffer_key(table_pk))
+        return
+    change(buffer)
+    if len(buffer['messages']) > BUFFER_SIZE:
+        dropped = buffer['messages'][:-BUFFER_SIZE]
+        del buffer['messages'][:-BUFFER_SIZE]
+        for msg in dropped:
+            buffer['upvoted'].pop(msg['id'], None)
+        buffer['complete'] = False
+    buffer['version'] = version
+    messages_cache.set(buffer_key(table_pk), buffer, None)
+
+
+def buffer_message(msg):
+    """ Adds a new message to its table's buffer
+
+    Args:
+        msg::Message
+            The new message, with its author loaded
+    """
+    def change(buffer):
+        # a buffer rebuilt after the message was saved already holds it
+        if buffer['messages'] and buffer['messages'][-1]['id'] >= msg.id:
+            return
+        buffer['messages'].append(message_data(msg))
+
+    write_through(msg.table_id_id, change)
+
+
+def buffer_upvote(msg):
+    """ Updates the upvote count of a message in its table's buffer
+
+    Args:
+        msg::Message
+            The upvoted message
+    """
+    def change(buffer):
+        for data in buffer['messages']:
+            if data['id'] == msg.id:
+                # counts only go up, an older count arriving late is ignored
+                data['upvotes'] = max(data['upvotes'], msg.total_upvotes)
+                buffer['upvoted'][msg.id] = msg.last_upvoted
+                return
+
+    write_through(msg.table_id_id, change)
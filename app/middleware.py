@@ -0,0 +1,19 @@
+""" Middleware run on every request made to the web application """
+
+from app.presence import record_heartbeat
+
+
+class PresenceMiddleware:
+    """ Records a heartbeat for every authenticated request, so that the
+    user is counted as being in the cafe """
+
+    def __init__(self, get_response):
+        """ Stores the next handler in the middleware chain """
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """ Records the heartbeat before the view runs, so the page counts
+        the user viewing it """
+        if request.user.is_authenticated:
+            record_heartbeat(request.user)
+        return self.get_response(request)
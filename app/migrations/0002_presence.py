@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Presence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presence', serialize=False, to='app.coffeeuser')),
+                ('last_seen', models.DateTimeField(db_index=True)),
+                ('table_seen', models.DateTimeField(blank=True, null=True)),
+                ('table_id', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='present_users', to='app.cafetable')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='presence',
+            index=models.Index(fields=['table_id', 'table_seen'], name='app_presenc_table_i_b3677c_idx'),
+        ),
+    ]
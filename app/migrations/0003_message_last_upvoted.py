@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_presence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='last_upvoted',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['table_id', 'last_upvoted'], name='app_message_table_i_f785dd_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_message_last_upvoted'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['table_id', 'message_date', 'id'], name='app_message_table_i_32c13f_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_message_history_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='recurring_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def first_occurrences(apps, schema_editor):
+    """ Makes the current cycle of every task an occurrence, keeping who
+    completed it """
+    Task = apps.get_model('app', 'Task')
+    TaskOccurrence = apps.get_model('app', 'TaskOccurrence')
+    for task in Task.objects.prefetch_related('completed_by'):
+        occurrence = TaskOccurrence.objects.create(task=task,
+                                                   date_set=task.date_set)
+        occurrence.completed_by.set(task.completed_by.all())
+        task.current_occurrence = occurrence
+        task.save(update_fields=['current_occurrence'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_task_recurring_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_set', models.DateField()),
+                ('completed_by', models.ManyToManyField(blank=True, related_name='completed_occurrences', to=settings.AUTH_USER_MODEL)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='app.task')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='current_occurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.taskoccurrence'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskoccurrence',
+            constraint=models.UniqueConstraint(fields=('task', 'date_set'), name='unique_task_occurrence'),
+        ),
+        migrations.RunPython(first_occurrences, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='task',
+            name='completed_by',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_members(apps, schema_editor):
+    """ Counts the members of the existing tables """
+    CafeTable = apps.get_model('app', 'CafeTable')
+    CoffeeUser = apps.get_model('app', 'CoffeeUser')
+    Membership = CoffeeUser.cafe_table_ids.through
+
+    def count(**filters):
+        members = Membership.objects.filter(
+            cafetable_id=OuterRef('pk'), **filters).order_by().values(
+                'cafetable_id').annotate(count=Count('*')).values('count')
+        return Coalesce(Subquery(members), 0)
+
+    CafeTable.objects.update(member_count=count(),
+                             student_count=count(coffeeuser__is_staff=False))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_task_occurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cafetable',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cafetable',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_members, migrations.RunPython.noop),
+    ]
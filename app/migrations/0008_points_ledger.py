@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def opening_balances(apps, schema_editor):
+    """ Records the points users already have as a balance entry each, so
+    that the ledger adds up to the current totals """
+    CoffeeUser = apps.get_model('app', 'CoffeeUser')
+    PointsEntry = apps.get_model('app', 'PointsEntry')
+    PointsEntry.objects.bulk_create(
+        [PointsEntry(user_id=user_pk, delta=points, reason=3)
+         for user_pk, points in CoffeeUser.objects.filter(
+             points__gt=0).values_list('pk', 'points')],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_table_member_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.PositiveSmallIntegerField(choices=[(1, 'Task'), (2, 'Bonus'), (3, 'Balance')])),
+                ('date', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_entries', to='app.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pointsentry',
+            index=models.Index(fields=['user', 'date'], name='app_pointse_user_id_5e347a_idx'),
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
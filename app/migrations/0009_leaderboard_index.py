@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_points_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coffeeuser',
+            index=models.Index(fields=['is_staff', 'points'], name='app_coffeeu_is_staf_644497_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def entry_tables(apps, schema_editor):
+    """ Records the table the points of the existing entries were earned in
+    """
+    PointsEntry = apps.get_model('app', 'PointsEntry')
+    Task = apps.get_model('app', 'Task')
+    PointsEntry.objects.filter(task__isnull=False).update(
+        table_id=Subquery(Task.objects.filter(
+            pk=OuterRef('task_id')).values('table_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_leaderboard_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointsentry',
+            name='table',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_entries', to='app.cafetable'),
+        ),
+        migrations.RunPython(entry_tables, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='PointsBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('points', models.IntegerField(default=0)),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_buckets', to='app.cafetable')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_buckets', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pointsbucket',
+            index=models.Index(fields=['day'], name='app_pointsb_day_689150_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pointsbucket',
+            constraint=models.UniqueConstraint(fields=('table', 'day', 'user'), name='unique_points_bucket'),
+        ),
+    ]
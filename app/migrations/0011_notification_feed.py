@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_points_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coffeeuser',
+            name='notifications_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['table_id', 'date', 'id'], name='app_notific_table_i_fe51f4_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_notification_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='subject',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='times',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
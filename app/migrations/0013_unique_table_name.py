@@ -0,0 +1,96 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:51
+
+from django.db import migrations, models
+from django.db.models import Case, Count, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+# duplicates repointed per query, well under SQLite's expression depth
+CHUNK_SIZE = 500
+
+
+def merge_duplicates(apps, schema_editor):
+    """ Merges the tables sharing a university and name into the oldest one,
+        moving everything that refers to them over """
+    CafeTable = apps.get_model('app', 'CafeTable')
+    CoffeeUser = apps.get_model('app', 'CoffeeUser')
+    PointsBucket = apps.get_model('app', 'PointsBucket')
+    Membership = CoffeeUser.cafe_table_ids.through
+
+    # the table each duplicate is merged into
+    kept = {}
+    merged = {}
+    for pk, university, name in CafeTable.objects.order_by('pk').values_list(
+            'pk', 'university', 'table_id'):
+        keeper = kept.setdefault((university, name), pk)
+        if keeper != pk:
+            merged[pk] = keeper
+    if not merged:
+        return
+    duplicates = list(merged)
+
+    for model, field in (('Task', 'table_id'), ('Message', 'table_id'),
+                         ('Report', 'table_id'), ('Notification', 'table_id'),
+                         ('Presence', 'table_id'), ('PointsEntry', 'table')):
+        rows = apps.get_model('app', model).objects
+        for i in range(0, len(duplicates), CHUNK_SIZE):
+            chunk = duplicates[i:i + CHUNK_SIZE]
+            rows.filter(**{field + '__in': chunk}).update(**{field: Case(
+                *[When(**{field: pk}, then=Value(merged[pk]))
+                  for pk in chunk], output_field=models.IntegerField())})
+
+    # members of a duplicate become members of the kept table, once
+    Membership.objects.bulk_create([
+        Membership(coffeeuser_id=user_pk, cafetable_id=merged[table_pk])
+        for user_pk, table_pk in Membership.objects.filter(
+            cafetable_id__in=duplicates).values_list('coffeeuser_id',
+                                                     'cafetable_id')
+    ], ignore_conflicts=True)
+
+    # the leaderboard buckets of a day are added to the kept table's
+    points = {}
+    for table_pk, day, user_pk, total in PointsBucket.objects.filter(
+            table_id__in=duplicates).values_list('table_id', 'day', 'user_id',
+                                                 'points'):
+        key = (merged[table_pk], day, user_pk)
+        points[key] = points.get(key, 0) + total
+    PointsBucket.objects.filter(table_id__in=duplicates).delete()
+    buckets = {(bucket.table_id, bucket.day, bucket.user_id): bucket
+               for bucket in PointsBucket.objects.filter(
+                   table_id__in=set(merged.values()),
+                   day__in={day for _, day, _ in points})}
+    for key, total in points.items():
+        if key in buckets:
+            buckets[key].points += total
+    PointsBucket.objects.bulk_update(
+        [buckets[key] for key in points if key in buckets], ['points'])
+    PointsBucket.objects.bulk_create([
+        PointsBucket(table_id=table_pk, day=day, user_id=user_pk,
+                     points=total)
+        for (table_pk, day, user_pk), total in points.items()
+        if (table_pk, day, user_pk) not in buckets])
+
+    CafeTable.objects.filter(pk__in=duplicates).delete()
+
+    def count(**filters):
+        members = Membership.objects.filter(
+            cafetable_id=OuterRef('pk'), **filters).order_by().values(
+                'cafetable_id').annotate(count=Count('*')).values('count')
+        return Coalesce(Subquery(members), 0)
+
+    CafeTable.objects.filter(pk__in=set(merged.values())).update(
+        member_count=count(), student_count=count(coffeeuser__is_staff=False))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cafetable',
+            constraint=models.UniqueConstraint(fields=('university', 'table_id'), name='unique_table_name'),
+        ),
+    ]
@@ -2,6 +2,9 @@
 the database schema. """
 
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Subquery, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 
 # Isabel & Victoria - 16/2/21, Isabel 17/2/21
@@ -13,6 +16,15 @@ class CafeTable(models.Model):
     # key field id = models.AutoField(primary_key=True)
     table_id = models.CharField(max_length=50)
     university = models.CharField(max_length=50)
+    # kept up to date by app/signals.py, repaired by recount_table_members
+    member_count = models.PositiveIntegerField(default=0)
+    student_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """ A university has one table of each name, looked up through the
+        constraint's index """
+        constraints = [models.UniqueConstraint(
+            fields=['university', 'table_id'], name='unique_table_name')]
 
     def __str__(self):
         """ Function to return the id of a specific table
@@ -133,6 +145,7 @@ class CoffeeUser(AbstractBaseUser):
     year = models.PositiveIntegerField(null=True, blank=True)
     course = models.CharField(max_length=50, blank=True)
     cafe_table_ids = models.ManyToManyField(CafeTable, blank=True)
+    # sum of the user's points entries, kept up to date by app/points.py
     points = models.PositiveIntegerField(default=0)
     studying_until = models.DateTimeField(null=True, blank=True)
     share_tables = models.BooleanField(default=True)
@@ -140,6 +153,8 @@ class CoffeeUser(AbstractBaseUser):
     next_possible_set = models.DateField(null=True, blank=True)
     student_tasks_completed = models.PositiveIntegerField(default=0)
     next_possible_complete = models.DateField(null=True, blank=True)
+    # when the user last saw their notifications
+    notifications_seen = models.DateTimeField(null=True, blank=True)
     # Social media
     facebook = models.CharField(max_length=255, null=True, blank=True)
     twitter = models.CharField(max_length=255, null=True, blank=True)
@@ -150,6 +165,10 @@ class CoffeeUser(AbstractBaseUser):
 
     objects = CoffeeUserManager()
 
+    class Meta:
+        """ Index used to read the leaderboard and the rank of a student """
+        indexes = [models.Index(fields=['is_staff', 'points'])]
+
     # Required functions for custom user model
     def __str__(self):
         """ Returns the specific user's email address """
@@ -164,6 +183,36 @@ class CoffeeUser(AbstractBaseUser):
         return True
 
 
+class TaskQuerySet(models.QuerySet):
+    """ Queries for listing tasks """
+
+    def with_completion(self):
+        """ Annotates each task with how many people completed it and how
+            many can, counted by the database in the same query as the tasks
+
+        Returns:
+            tasks::QuerySet
+                The tasks with completed_count, eligible_count and
+                creator_is_staff set, and their creator loaded
+        """
+        completions = TaskOccurrence.completed_by.through.objects.filter(
+            taskoccurrence_id=OuterRef('current_occurrence')).order_by(
+            ).values('taskoccurrence_id').annotate(
+                count=Count('*')).values('count')
+        # the students of the table, as counted on the table
+        students = F('table_id__student_count')
+        return self.select_related('created_by').annotate(
+            completed_count=Coalesce(Subquery(completions), 0),
+            creator_is_staff=F('created_by__is_staff'),
+        ).annotate(
+            # students can't complete the tasks they set
+            eligible_count=Case(
+                When(creator_is_staff=True, then=students),
+                default=students - 1,
+            ),
+        )
+
+
 class Task(models.Model):
     """ Defines all fields for a task """
     POINTS = ((1, "1"), (2, "2"), (3, "3"), (4, "4"), (5, "5"),
@@ -176,21 +225,35 @@ class Task(models.Model):
                                  on_delete=models.CASCADE)
     created_by = models.ForeignKey(CoffeeUser, related_name="created_tasks",
                                    on_delete=models.CASCADE)
-    completed_by = models.ManyToManyField(CoffeeUser, blank=True)
+    # the cycle of the task currently set, holding who completed it
+    current_occurrence = models.ForeignKey('TaskOccurrence', null=True,
+                                           blank=True, related_name="+",
+                                           on_delete=models.SET_NULL)
     date_set = models.DateField(auto_now_add=True)
     task_content = models.TextField(max_length=4000)
     points = models.PositiveIntegerField(default=0, choices=POINTS)
-    recurring_date = models.DateField(null=True, blank=True)
+    # when the task is due to be set again, see app/recurrence.py
+    recurring_date = models.DateField(null=True, blank=True, db_index=True)
     recurrence_interval = models.CharField(max_length=1, choices=REPEATS)
     no_of_repeats = models.PositiveIntegerField(default=0)
     max_repeats = models.PositiveIntegerField(default=0)
 
     REQUIRED_FIELDS = ["task_name", "task_content"]
 
+    objects = TaskQuerySet.as_manager()
+
     def __str__(self):
         """ Returns the name of the specific task """
         return self.task_name
 
+    def save(self, *args, **kwargs):
+        """ Saves the task, setting its first occurrence when it is created """
+        super().save(*args, **kwargs)
+        if self.current_occurrence_id is None:
+            self.current_occurrence = TaskOccurrence.objects.create(
+                task=self, date_set=self.date_set)
+            super().save(update_fields=['current_occurrence'])
+
     def get_number_completed_task(self):
         """ Returns the number of users who've completed a specific task
 
@@ -200,14 +263,34 @@ class Task(models.Model):
             result[1]::int
                 Total number of people who can complete this task
         """
-        out_of = self.table_id.coffeeuser_set.exclude(is_staff=1).count()
+        # already counted when listed through with_completion
+        if hasattr(self, 'eligible_count'):
+            return self.completed_count, self.eligible_count
+        out_of = self.table_id.student_count
         if self.created_by.is_staff:
-            result = (self.completed_by.count(), out_of)
+            result = (self.current_occurrence.completed_by.count(), out_of)
         else:
-            result = (self.completed_by.count(), out_of - 1)
+            result = (self.current_occurrence.completed_by.count(),
+                      out_of - 1)
         return result[0], result[1]
 
 
+class TaskOccurrence(models.Model):
+    """ Defines one cycle of a task, recurring tasks getting a new one each
+    time they are set again so that past completions are kept """
+    task = models.ForeignKey(Task, related_name="occurrences",
+                             on_delete=models.CASCADE)
+    date_set = models.DateField()
+    completed_by = models.ManyToManyField(CoffeeUser, blank=True,
+                                          related_name="completed_occurrences")
+
+    class Meta:
+        """ A task is set at most once a day, so setting it again twice is
+        harmless """
+        constraints = [models.UniqueConstraint(fields=['task', 'date_set'],
+                                               name='unique_task_occurrence')]
+
+
 class Message(models.Model):
     """ Defines all the information for a message """
     # please note Django implicitly gives an auto incrementing primary
@@ -221,6 +304,14 @@ class Message(models.Model):
     message_upvote = models.ManyToManyField(CoffeeUser,
                                             related_name="message_upvote")
     total_upvotes = models.PositiveIntegerField(default=0)
+    # when the message was last upvoted, so polls can find changed counts
+    last_upvoted = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """ Indexes used to find the messages upvoted since the last poll,
+        and to page through a table's history """
+        indexes = [models.Index(fields=['table_id', 'last_upvoted']),
+                   models.Index(fields=['table_id', 'message_date', 'id'])]
 
 
 class Report(models.Model):
@@ -252,3 +343,71 @@ class Notification(models.Model):
     notification_type = models.IntegerField(choices=NOTIFICATION_TYPES)
     text_preview = models.CharField(max_length=90, blank=True)
     date = models.DateTimeField(auto_now_add=True)
+    # what the notification is about, events about the same subject in a
+    # short time are coalesced into one notification
+    subject = models.CharField(max_length=30, blank=True)
+    # the number of events coalesced into the notification
+    times = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        """ Index used to page through the notifications of tables, newest
+        first """
+        indexes = [models.Index(fields=['table_id', 'date', 'id'])]
+
+
+class PointsEntry(models.Model):
+    """ Records points given to a user. Entries are only ever added, the
+    points of a user being the sum of theirs """
+    TASK, BONUS, BALANCE = 1, 2, 3
+    REASONS = ((TASK, 'Task'), (BONUS, 'Bonus'), (BALANCE, 'Balance'))
+
+    user = models.ForeignKey(CoffeeUser, related_name="points_entries",
+                             on_delete=models.CASCADE)
+    delta = models.IntegerField()
+    reason = models.PositiveSmallIntegerField(choices=REASONS)
+    task = models.ForeignKey(Task, related_name="points_entries", null=True,
+                             blank=True, on_delete=models.SET_NULL)
+    # the table the points were earned in
+    table = models.ForeignKey(CafeTable, related_name="points_entries",
+                              null=True, blank=True,
+                              on_delete=models.SET_NULL)
+    date = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        """ Index used to sum the points of a user over a period """
+        indexes = [models.Index(fields=['user', 'date'])]
+
+
+class PointsBucket(models.Model):
+    """ Holds the points a user earned in a table on a day, so that the
+    leaderboards of the last days only add up a few rows per student """
+    user = models.ForeignKey(CoffeeUser, related_name="points_buckets",
+                             on_delete=models.CASCADE)
+    table = models.ForeignKey(CafeTable, related_name="points_buckets",
+                              on_delete=models.CASCADE)
+    day = models.DateField()
+    points = models.IntegerField(default=0)
+
+    class Meta:
+        """ One bucket per user, table and day, the index being used by the
+        leaderboards of a table """
+        constraints = [models.UniqueConstraint(
+            fields=['table', 'day', 'user'], name='unique_points_bucket')]
+        indexes = [models.Index(fields=['day'])]
+
+
+class Presence(models.Model):
+    """ Records when a user was last seen using the web app, and the table
+    they were last seen chatting in """
+    user = models.OneToOneField(CoffeeUser, primary_key=True,
+                                related_name="presence",
+                                on_delete=models.CASCADE)
+    last_seen = models.DateTimeField(db_index=True)
+    table_id = models.ForeignKey(CafeTable, related_name="present_users",
+                                 null=True, blank=True,
+                                 on_delete=models.SET_NULL)
+    table_seen = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """ Index used to find who is currently in a table """
+        indexes = [models.Index(fields=['table_id', 'table_seen'])]
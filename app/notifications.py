@@ -0,0 +1,237 @@
+""" Posting notifications to tables, coalescing repeated events, and the
+feed of the notifications posted in a user's tables, paged newest first
+through the (table_id, date, id) index, with the number of notifications the
+user hasn't seen yet """
+
+import datetime
+import pytz
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+from app.models import CoffeeUser, Notification
+from app.small_scripts_def import check_points_treshold, how_much_to_go
+from app.table_members import member_table_ids
+from app.versions import bump, feed_version
+
+# number of notifications sent per page of the feed
+FEED_PAGE_SIZE = 10
+# unread notifications counted at most, more are shown as "99+"
+UNREAD_LIMIT = 99
+# seconds the number of unread notifications of a user is cached for
+UNREAD_TIMEOUT = 15
+# events about the same subject within this time make a single notification
+COALESCE_WINDOW = datetime.timedelta(hours=1)
+# days notifications are kept for before being pruned
+NOTIFICATION_DAYS = 30
+# points to go until the next collectable under which the table is told
+NEAR_COLLECTABLE = 10
+
+
+def unread_key(user_pk):
+    """ Returns the cache key of a user's number of unread notifications """
+    return 'notifications:unread:%d' % user_pk
+
+
+def notify(table_pk, notification_type, subject, text):
+    """ Posts a notification to a table. If one about the same subject was
+        posted within COALESCE_WINDOW, it is updated and moved to the top of
+        the feed instead, so repeated events don't fill the feed
+
+    Args:
+        table_pk::int
+            The id of the table the notification is posted to
+        notification_type::int
+            One of Notification.NOTIFICATION_TYPES
+        subject::str
+            What the notification is about, e.g. 'completed:<task id>'
+        text::str
+            The text of the notification, the latest replacing the previous
+    """
+    now = timezone.now()
+    coalesced = Notification.objects.filter(
+        table_id_id=table_pk, notification_type=notification_type,
+        subject=subject, date__gte=now - COALESCE_WINDOW,
+    ).update(date=now, text_preview=text, times=F('times') + 1)
+    if not coalesced:
+        Notification.objects.create(table_id_id=table_pk,
+                                    notification_type=notification_type,
+                                    subject=subject, text_preview=text)
+    # the feeds cached for the table are out of date
+    bump([feed_version(table_pk)])
+
+
+def near_collectable(points):
+    """ Checks whether a student is close to their next collectable
+
+    Args:
+        points::int
+            The points of the student
+
+    Returns:
+        near::bool
+            Whether they have less than NEAR_COLLECTABLE points to go
+    """
+    to_go = int(how_much_to_go(check_points_treshold(points)))
+    return 0 < to_go < NEAR_COLLECTABLE
+
+
+def points_earned(totals, tables):
+    """ Tells the tables where students earned points when the points took
+        them close to their next collectable, once as they get there
+
+    Args:
+        totals::dict
+            The points each user (by id) just earned
+        tables::dict
+            The id of the table each user earned them in
+    """
+    # points not earned in a table aren't told anywhere
+    user_ids = [user_pk for user_pk, table_pk in tables.items()
+                if table_pk is not None and totals[user_pk] > 0]
+    if not user_ids:
+        return
+    students = CoffeeUser.objects.filter(
+        pk__in=user_ids, is_staff=False).only('first_name', 'last_name',
+                                              'points')
+    for student in students:
+        if not near_collectable(student.points) or \
+           near_collectable(student.points - totals[student.pk]):
+            continue
+        text = student.first_name + " " + student.last_name + \
+            " has less than 10 points to go until their next collectable!"
+        notify(tables[student.pk], 1, 'collectable:%d' % student.pk, text)
+
+
+def prune_notifications(now=None):
+    """ Deletes the notifications older than NOTIFICATION_DAYS, so that the
+        table stays bounded
+
+    Args:
+        now::datetime
+            The time the notifications are pruned at, now by default
+
+    Returns:
+        pruned::int
+            The number of notifications deleted
+    """
+    if now is None:
+        now = timezone.now()
+    cutoff = now - datetime.timedelta(days=NOTIFICATION_DAYS)
+    pruned, _ = Notification.objects.filter(date__lt=cutoff).delete()
+    return pruned
+
+
+def notification_data(notification):
+    """ Formats a notification so it can be sent as JSON
+
+    Args:
+        notification::Notification
+            The notification
+
+    Returns:
+        data::dict
+            The information displayed for the notification
+    """
+    return {
+        'id': notification.id,
+        'type': notification.notification_type,
+        # format the time so it can be converted to the user's timezone in JS
+        'date': pytz.utc.localize(notification.date).isoformat(),
+        'text_preview': notification.text_preview,
+        'times': notification.times,
+    }
+
+
+def feed_rows(user, cursor):
+    """ Finds the notifications of a user's tables older than a given
+        notification, one more than a page to tell if there is another.
+        Seeks from the cursor through the index, so every page costs the same
+        however far back it is
+
+    Args:
+        user::CoffeeUser
+            The user reading the feed
+        cursor::tuple
+            The date and id of the oldest notification the client has, None
+            to get the newest notifications
+
+    Returns:
+        rows::list
+            Up to FEED_PAGE_SIZE + 1 notifications, newest first
+    """
+    rows = Notification.objects.filter(
+        table_id__in=member_table_ids(user))
+    if cursor is not None:
+        date, notification_id = cursor
+        # bounding the date enters each table's index at the cursor instead
+        # of walking down from its newest notification
+        rows = rows.filter(Q(date__lt=date) |
+                           Q(date=date, id__lt=notification_id),
+                           date__lte=date)
+    return list(rows.order_by('-date', '-id')[:FEED_PAGE_SIZE + 1])
+
+
+def feed_page(rows):
+    """ Formats a page of the feed so it can be sent as JSON
+
+    Args:
+        rows::list
+            The notifications found by feed_rows
+
+    Returns:
+        data::dict
+            Up to FEED_PAGE_SIZE notifications as formatted by
+            notification_data (newest first), and whether there are older
+            ones
+    """
+    return {
+        'notifications': [notification_data(notification)
+                          for notification in rows[:FEED_PAGE_SIZE]],
+        'more': len(rows) > FEED_PAGE_SIZE,
+    }
+
+
+def unread_count(user):
+    """ Counts the notifications a user hasn't seen, up to UNREAD_LIMIT + 1
+
+    Args:
+        user::CoffeeUser
+            The user
+
+    Returns:
+        unread::int
+            The number of notifications posted in the user's tables since
+            they last saw their notifications
+    """
+    key = unread_key(user.pk)
+    unread = cache.get(key)
+    if unread is None:
+        rows = Notification.objects.filter(
+            table_id__in=member_table_ids(user))
+        if user.notifications_seen is not None:
+            rows = rows.filter(date__gt=user.notifications_seen)
+        # only counts through the index as far as shown
+        unread = rows[:UNREAD_LIMIT + 1].count()
+        cache.set(key, unread, UNREAD_TIMEOUT)
+    return unread
+
+
+def mark_read(user, newest):
+    """ Records that a user saw their notifications, only writing if they are
+        newer than the ones they saw before
+
+    Args:
+        user::CoffeeUser
+            The user
+        newest::datetime
+            The date of the newest notification the user saw, None if there
+            were none
+    """
+    if newest is None:
+        return
+    if user.notifications_seen is not None and \
+       newest <= user.notifications_seen:
+        return
+    user.notifications_seen = newest
+    CoffeeUser.objects.filter(pk=user.pk).update(notifications_seen=newest)
+    cache.set(unread_key(user.pk), 0, UNREAD_TIMEOUT)
@@ -0,0 +1,55 @@
+""" Giving points to users. Every change is recorded in the points ledger,
+and the points stored on each user are the total of their entries, kept up
+to date as entries are added """
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from app.models import CoffeeUser, PointsEntry
+from app.leaderboard import add_to_buckets, points_changed
+from app.notifications import points_earned
+
+
+def award(entries):
+    """ Records points entries and adds them to the users' totals and the
+        leaderboard buckets, with one insert and one update for each
+        different number of points, then tells the tables of the students
+        getting close to their next collectable
+
+    Args:
+        entries::list
+            The new (unsaved) points entries
+    """
+    if not entries:
+        return
+    PointsEntry.objects.bulk_create(entries)
+    add_to_buckets(entries)
+    totals = {}
+    tables = {}
+    for entry in entries:
+        totals[entry.user_id] = totals.get(entry.user_id, 0) + entry.delta
+        tables.setdefault(entry.user_id, entry.table_id)
+    users = {}
+    for user_pk, delta in totals.items():
+        users.setdefault(delta, []).append(user_pk)
+    for delta, user_ids in users.items():
+        CoffeeUser.objects.filter(pk__in=user_ids).update(
+            points=F('points') + delta)
+    points_earned(totals, tables)
+    # once committed, so the old points can't be cached again meanwhile
+    transaction.on_commit(points_changed)
+
+
+def rebuild_totals():
+    """ Recomputes the points of every user from the ledger, in a single
+        query
+
+    Returns:
+        rebuilt::int
+            The number of users whose total was recomputed
+    """
+    total = PointsEntry.objects.filter(user=OuterRef('pk')).order_by(
+        ).values('user').annotate(total=Sum('delta')).values('total')
+    rebuilt = CoffeeUser.objects.update(points=Coalesce(Subquery(total), 0))
+    transaction.on_commit(points_changed)
+    return rebuilt
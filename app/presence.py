@@ -0,0 +1,99 @@
+""" Functions keeping track of which users are currently in the cafe. Every
+authenticated request records a heartbeat, so counting the active users is
+a cached count of recent heartbeats rather than decoding every session. """
+
+import datetime
+from django.core.cache import cache
+from django.utils import timezone
+from app.models import CoffeeUser, Presence
+
+# users who sent a heartbeat within this window are in the cafe
+ONLINE_WINDOW = datetime.timedelta(minutes=5)
+# seconds between two heartbeats of the same user being written to the db
+HEARTBEAT_INTERVAL = 30
+# seconds the number of active users is cached for
+COUNT_TIMEOUT = 15
+
+COUNT_KEY = 'presence:count'
+
+
+def heartbeat_key(user_pk):
+    """ Returns the cache key remembering a user's last written heartbeat """
+    return 'presence:user:%d' % user_pk
+
+
+def record_heartbeat(user, table=None, force=False):
+    """ Records that a user is using the web app, and optionally which table
+        they are chatting in. Heartbeats are throttled so that a user only
+        writes to the database once every HEARTBEAT_INTERVAL seconds.
+
+    Args:
+        user::CoffeeUser
+            The user that was seen
+        table::CafeTable
+            The table the user is currently in, if any
+        force::boolean
+            Whether to write the heartbeat even if one was written recently
+    """
+    key = heartbeat_key(user.pk)
+    table_pk = table.pk if table is not None else 0
+    last = cache.get(key)
+    # a table heartbeat also counts as a heartbeat for the whole cafe
+    if not force and last is not None and (table is None or
+                                           last == table_pk):
+        return
+
+    now = timezone.now()
+    fields = {'last_seen': now}
+    if table is not None:
+        fields['table_id'] = table
+        fields['table_seen'] = now
+
+    # only users that were not already in the cafe change the active count
+    if not Presence.objects.filter(
+            user=user, last_seen__gte=now - ONLINE_WINDOW).update(**fields):
+        Presence.objects.update_or_create(user=user, defaults=fields)
+        cache.delete(COUNT_KEY)
+    cache.set(key, table_pk, HEARTBEAT_INTERVAL)
+
+
+def clear_presence(user):
+    """ Removes a user from the cafe straight away (e.g. when logging out)
+
+    Args:
+        user::CoffeeUser
+            The user who left
+    """
+    Presence.objects.filter(user=user).delete()
+    cache.delete_many([heartbeat_key(user.pk), COUNT_KEY])
+
+
+def count_online():
+    """ Calculates the number of users currently in the cafe
+
+    Returns:
+        count::int
+            The number of users seen within the online window
+    """
+    count = cache.get(COUNT_KEY)
+    if count is None:
+        count = Presence.objects.filter(
+            last_seen__gte=timezone.now() - ONLINE_WINDOW).count()
+        cache.set(COUNT_KEY, count, COUNT_TIMEOUT)
+    return count
+
+
+def users_in_table(table):
+    """ Finds the users currently chatting in a specific table
+
+    Args:
+        table::CafeTable
+            The table to look at
+
+    Returns:
+        users::QuerySet
+            The users seen in the table within the online window
+    """
+    return CoffeeUser.objects.filter(
+        presence__table_id=table,
+        presence__table_seen__gte=timezone.now() - ONLINE_WINDOW)
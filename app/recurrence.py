@@ -0,0 +1,61 @@
+""" Resets the recurring tasks that are due, run by the reset_recurring_tasks
+command instead of on every request """
+
+import datetime
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from app.models import Task, TaskOccurrence
+
+
+def due_tasks(today):
+    """ Finds the recurring tasks due to be set again
+
+    Args:
+        today::date
+            The date the tasks are reset on
+
+    Returns:
+        tasks::QuerySet
+            The tasks due today, or on a day the reset didn't run, that
+            haven't been repeated as many times as they can be yet
+    """
+    return Task.objects.filter(
+        recurring_date__lte=today,
+        no_of_repeats__lte=F('max_repeats'),
+    ).exclude(max_repeats=0).exclude(recurrence_interval="n")
+
+
+def reset_recurring_tasks(today=None):
+    """ Sets the recurring tasks that are due again by starting a new
+        occurrence of each, in a fixed number of queries however many tasks
+        there are. The completions of the previous occurrences are kept
+
+    Args:
+        today::date
+            The date the tasks are reset on, today by default
+
+    Returns:
+        reset::int
+            The number of tasks set again
+    """
+    if today is None:
+        today = datetime.date.today()
+    with transaction.atomic():
+        task_ids = list(due_tasks(today).select_for_update().values_list(
+            'id', flat=True))
+        if not task_ids:
+            return 0
+        # a task already set again today keeps its occurrence
+        TaskOccurrence.objects.bulk_create(
+            [TaskOccurrence(task_id=task_id, date_set=today)
+             for task_id in task_ids], ignore_conflicts=True)
+        # the task is due again once it is completed, so running the reset
+        # twice in a day doesn't count a repeat twice
+        Task.objects.filter(id__in=task_ids).update(
+            current_occurrence=Subquery(TaskOccurrence.objects.filter(
+                task=OuterRef('pk'), date_set=today).values('pk')[:1]),
+            no_of_repeats=F('no_of_repeats') + 1,
+            date_set=today,
+            recurring_date=None,
+        )
+    return len(task_ids)
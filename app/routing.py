@@ -0,0 +1,18 @@
+""" The URLs handled by the asynchronous consumers, in front of the normal
+Django views, and the WebSocket URLs """
+
+from django.urls import path
+from channels.auth import AuthMiddlewareStack
+from app import consumers
+
+http_urlpatterns = [
+    path('wait_msgs/<int:table>',
+         AuthMiddlewareStack(consumers.LongPollConsumer.as_asgi())),
+    path('table_events/<int:table>',
+         AuthMiddlewareStack(consumers.TableStreamConsumer.as_asgi())),
+]
+
+websocket_urlpatterns = [
+    path('ws/tables/<int:table>',
+         AuthMiddlewareStack(consumers.ChatConsumer.as_asgi())),
+]
@@ -0,0 +1,136 @@
+""" Receivers keeping derived data in sync when events happen in the app """
+
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import m2m_changed, post_init, post_save, \
+                                     pre_delete
+from django.dispatch import receiver
+from app.models import CafeTable, CoffeeUser
+from app.presence import record_heartbeat, clear_presence
+from app.table_members import Membership, adjust_counts, \
+                              memberships_changed, forget_tables
+from app.directory import DIRECTORY_FIELDS, forget_directories, \
+                          member_changed
+
+
+@receiver(user_logged_in)
+def user_entered_cafe(sender, request, user, **kwargs):
+    """ Counts a user as being in the cafe as soon as they log in """
+    record_heartbeat(user, force=True)
+
+
+@receiver(user_logged_out)
+def user_left_cafe(sender, request, user, **kwargs):
+    """ Stops counting a user as being in the cafe once they log out """
+    if user is not None:
+        clear_presence(user)
+
+
+@receiver(m2m_changed, sender=Membership)
+def table_members_changed(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """ Keeps the member counts of tables, the cached tables of users and
+        the cached members of tables in step as users join and leave them,
+        from either side of the relation """
+    if action in ('pre_remove', 'pre_clear'):
+        # remove() reports every id it was given, even the ones that aren't
+        # members, so the memberships actually removed are found first
+        if reverse:
+            memberships = Membership.objects.filter(cafetable_id=instance.pk)
+            if pk_set is not None:
+                memberships = memberships.filter(coffeeuser_id__in=pk_set)
+        else:
+            memberships = Membership.objects.filter(coffeeuser_id=instance.pk)
+            if pk_set is not None:
+                memberships = memberships.filter(cafetable_id__in=pk_set)
+        instance._left_tables = list(memberships.values_list(
+            'cafetable_id', 'coffeeuser__is_staff', 'coffeeuser_id'))
+    elif action in ('post_remove', 'post_clear'):
+        left = instance.__dict__.pop('_left_tables', [])
+        memberships_changed([(table_pk, is_staff)
+                             for table_pk, is_staff, _ in left], -1)
+        forget_tables({user_pk for _, _, user_pk in left})
+        forget_directories({table_pk for table_pk, _, _ in left})
+    elif action == 'post_add' and pk_set:
+        if reverse:
+            memberships = [(instance.pk, is_staff) for is_staff in
+                           CoffeeUser.objects.filter(pk__in=pk_set).
+                           values_list('is_staff', flat=True)]
+            forget_tables(pk_set)
+            forget_directories([instance.pk])
+        else:
+            memberships = [(table_pk, instance.is_staff)
+                           for table_pk in pk_set]
+            forget_tables([instance.pk])
+            forget_directories(pk_set)
+        memberships_changed(memberships, 1)
+    if not reverse and action.startswith('post_'):
+        # the tables read earlier in the request are out of date too
+        instance.__dict__.pop('_member_table_ids', None)
+
+
+@receiver(post_init, sender=CoffeeUser)
+def remember_staff_status(sender, instance, **kwargs):
+    """ Remembers whether a user was staff when loaded, to notice changes """
+    # a deferred field would cost a query to read
+    instance._loaded_is_staff = instance.__dict__.get('is_staff')
+    instance._loaded_university = instance.__dict__.get('university')
+    instance._loaded_details = shown_details(instance)
+
+
+@receiver(post_save, sender=CoffeeUser)
+def staff_status_changed(sender, instance, created, **kwargs):
+    """ Moves a user between the staff and the students of their tables """
+    if (not created and instance._loaded_is_staff is not None and
+       instance.is_staff != instance._loaded_is_staff):
+        table_ids = list(Membership.objects.filter(
+            coffeeuser_id=instance.pk).values_list('cafetable_id', flat=True))
+        adjust_counts(table_ids, 0, -1 if instance.is_staff else 1)
+    instance._loaded_is_staff = instance.is_staff
+
+
+@receiver(post_save, sender=CoffeeUser)
+def user_university_changed(sender, instance, created, **kwargs):
+    """ Drops the cached tables of a user who changed university, as only the
+        tables of their university count, or of a new user whose id was
+        used by a deleted one """
+    if created or (instance._loaded_university is not None and
+                   instance.university != instance._loaded_university):
+        forget_tables([instance.pk])
+        instance.__dict__.pop('_member_table_ids', None)
+    instance._loaded_university = instance.university
+
+
+def shown_details(user):
+    """ Returns the details of a user shown to the members of their tables,
+        None for the ones not loaded """
+    return tuple(user.__dict__.get(field) for field in DIRECTORY_FIELDS)
+
+
+@receiver(post_save, sender=CoffeeUser)
+def member_details_changed(sender, instance, created, **kwargs):
+    """ Drops the cached members of a user's tables once the details shown
+        there changed """
+    details = shown_details(instance)
+    if not created and details != instance._loaded_details:
+        member_changed(instance.pk)
+    instance._loaded_details = details
+
+
+@receiver(pre_delete, sender=CoffeeUser)
+def member_deleted(sender, instance, **kwargs):
+    """ Removes a deleted user from the counts and cached members of their
+        tables, as deleting their memberships doesn't send m2m_changed """
+    memberships_changed(Membership.objects.filter(
+        coffeeuser_id=instance.pk).values_list('cafetable_id',
+                                               'coffeeuser__is_staff'), -1)
+    forget_tables([instance.pk])
+    member_changed(instance.pk)
+
+
+@receiver(pre_delete, sender=CafeTable)
+def table_deleted(sender, instance, **kwargs):
+    """ Drops the cached tables of the members of a deleted table, so that a
+        new table given its id isn't open to them, and its cached members """
+    forget_tables(Membership.objects.filter(
+        cafetable_id=instance.pk).values_list('coffeeuser_id', flat=True))
+    forget_directories([instance.pk])
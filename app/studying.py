@@ -0,0 +1,74 @@
+""" Whether users are studying, worked out from the time they set a study
+break until when reading them, so that showing it never writes. Finished
+study breaks are cleared by the clear_study_breaks command """
+
+import datetime
+from operator import itemgetter
+from app.models import CoffeeUser
+from app.directory import table_directory
+
+
+def is_studying(user, now=None):
+    """ Checks whether a user is studying
+
+    Args:
+        user::CoffeeUser
+            The user
+        now::datetime
+            The time to check at, now by default
+
+    Returns:
+        studying::bool
+            Whether the user's study break lasts past now
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    return user.studying_until is not None and user.studying_until > now
+
+
+def split_members(table, now=None):
+    """ Finds the members of a table, split between those studying and the
+        others
+
+    Args:
+        table::CafeTable
+            The table
+        now::datetime
+            The time to check at, now by default
+
+    Returns:
+        studying::list
+            The members studying as found by table_directory, those studying
+            the longest first
+        others::list
+            The members not studying
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    studying = []
+    others = []
+    for member in table_directory(table.pk):
+        until = member['studying_until']
+        if until is not None and until > now:
+            studying.append(member)
+        else:
+            others.append(member)
+    studying.sort(key=itemgetter('studying_until'), reverse=True)
+    return studying, others
+
+
+def clear_study_breaks(now=None):
+    """ Clears the study breaks that are over, in a single query
+
+    Args:
+        now::datetime
+            The time to clear them at, now by default
+
+    Returns:
+        cleared::int
+            The number of users whose study break was cleared
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    return CoffeeUser.objects.filter(studying_until__lte=now).update(
+        studying_until=None)
@@ -0,0 +1,157 @@
+""" Keeps the member counts stored on each table in step with the tables'
+members, so that reading them doesn't count the members every time, and
+caches the tables each user is part of, so that checking a user can access a
+table is a set lookup """
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from app.models import CafeTable, CoffeeUser
+
+Membership = CoffeeUser.cafe_table_ids.through
+
+# seconds the tables of a user are cached for, changes dropping them sooner
+MEMBERSHIP_TIMEOUT = 60 * 60
+
+
+def membership_key(user_pk):
+    """ Returns the cache key of the ids of a user's tables """
+    return 'memberships:%d' % user_pk
+
+
+def member_table_ids(user):
+    """ Finds the ids of the tables of their university a user is part of,
+        read once per request and cached between requests
+
+    Args:
+        user::CoffeeUser
+            The user
+
+    Returns:
+        table_ids::frozenset
+            The ids of the user's tables
+    """
+    table_ids = getattr(user, '_member_table_ids', None)
+    if table_ids is not None:
+        return table_ids
+    key = membership_key(user.pk)
+    table_ids = cache.get(key)
+    if table_ids is None:
+        table_ids = frozenset(Membership.objects.filter(
+            coffeeuser_id=user.pk,
+            cafetable__university=user.university,
+        ).values_list('cafetable_id', flat=True))
+        cache.set(key, table_ids, MEMBERSHIP_TIMEOUT)
+    user._member_table_ids = table_ids
+    return table_ids
+
+
+def is_member(user, table_pk):
+    """ Checks whether a user can access a table
+
+    Args:
+        user::CoffeeUser
+            The user
+        table_pk::int
+            The id of the table
+
+    Returns:
+        member::bool
+            Whether the user is part of the table
+    """
+    return table_pk in member_table_ids(user)
+
+
+def member_tables(user):
+    """ Finds the tables of their university a user is part of
+
+    Args:
+        user::CoffeeUser
+            The user
+
+    Returns:
+        tables::QuerySet
+            The user's tables
+    """
+    return CafeTable.objects.filter(pk__in=member_table_ids(user))
+
+
+def forget_tables(user_ids):
+    """ Drops the cached tables of users whose tables changed
+
+    Args:
+        user_ids::iterable
+            The ids of the users
+    """
+    keys = [membership_key(user_pk) for user_pk in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # again once committed, so that a read meanwhile can't keep the old ones
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def adjust_counts(table_ids, members, students):
+    """ Adds to the member counts of tables
+
+    Args:
+        table_ids::iterable
+            The ids of the tables
+        members::int
+            The number of members joining, negative if they left
+        students::int
+            How many of those members are students (not staff)
+    """
+    if not table_ids or not (members or students):
+        return
+    CafeTable.objects.filter(pk__in=table_ids).update(
+        member_count=F('member_count') + members,
+        student_count=F('student_count') + students,
+    )
+
+
+def memberships_changed(memberships, sign):
+    """ Updates the counts of the tables users joined or left, with one query
+        for each different change of count
+
+    Args:
+        memberships::iterable
+            (table id, whether the user is staff) for each membership
+        sign::int
+            1 if the users joined the tables, -1 if they left
+    """
+    deltas = {}
+    for table_pk, is_staff in memberships:
+        members, students = deltas.get(table_pk, (0, 0))
+        deltas[table_pk] = (members + sign,
+                            students + (0 if is_staff else sign))
+    tables = {}
+    for table_pk, delta in deltas.items():
+        tables.setdefault(delta, []).append(table_pk)
+    for (members, students), table_ids in tables.items():
+        adjust_counts(table_ids, members, students)
+
+
+def count_members(table_ids=None):
+    """ Recounts the members of tables from scratch, in a single query
+
+    Args:
+        table_ids::iterable
+            The ids of the tables to recount, every table by default
+
+    Returns:
+        recounted::int
+            The number of tables recounted
+    """
+    def count(**filters):
+        members = Membership.objects.filter(
+            cafetable_id=OuterRef('pk'), **filters).order_by().values(
+                'cafetable_id').annotate(count=Count('*')).values('count')
+        return Coalesce(Subquery(members), 0)
+
+    tables = CafeTable.objects.all()
+    if table_ids is not None:
+        tables = tables.filter(pk__in=table_ids)
+    return tables.update(member_count=count(),
+                         student_count=count(coffeeuser__is_staff=False))
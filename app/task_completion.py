@@ -0,0 +1,112 @@
+""" Completing tasks and awarding their points, as a single transaction that
+stays correct when the same task is completed by several requests at once """
+
+import datetime
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from app.models import CoffeeUser, PointsEntry, Task, TaskOccurrence
+from app.points import award
+
+# points given to everyone who completed a task once all of them did
+BONUS_POINTS = 2
+# tasks set by students that a student can complete in a day
+STUDENT_TASKS_PER_DAY = 2
+
+Completion = TaskOccurrence.completed_by.through
+
+
+class NotCompleted(Exception):
+    """ Raised to roll back a completion that can't be counted """
+
+
+def record_completion(user, task):
+    """ Marks the current occurrence of a task as completed by a user and
+        records the points earned in the ledger. Completions of the same
+        occurrence are run one at a time, a user completes it at most once,
+        and every count is incremented by the database
+
+    Args:
+        user::CoffeeUser
+            The user completing the task, updated with their new points
+        task::Task
+            The completed task
+
+    Returns:
+        completed::bool
+            Whether the completion was counted, False if the user had
+            already completed the task or can't complete it
+    """
+    today = datetime.date.today()
+    users = CoffeeUser.objects.filter(pk=user.pk)
+    try:
+        with transaction.atomic():
+            # completions of the same occurrence wait for each other, so only
+            # the last one awards the bonus
+            occurrence = TaskOccurrence.objects.select_for_update().get(
+                pk=task.current_occurrence_id)
+            task = Task.objects.with_completion().get(pk=task.pk)
+
+            if not task.created_by.is_staff:
+                if task.created_by_id == user.pk:
+                    raise NotCompleted
+                # a new day, the student can complete tasks again
+                users.filter(next_possible_complete__lte=today).update(
+                    student_tasks_completed=0)
+                # only counted while under the daily limit
+                counted = users.filter(
+                    student_tasks_completed__lt=STUDENT_TASKS_PER_DAY).update(
+                    student_tasks_completed=F('student_tasks_completed') + 1,
+                    next_possible_complete=today + datetime.timedelta(days=1),
+                )
+                if not counted:
+                    raise NotCompleted
+
+            # rejected by the unique constraint if already completed
+            Completion.objects.create(taskoccurrence_id=occurrence.pk,
+                                      coffeeuser_id=user.pk)
+            entries = [PointsEntry(user_id=user.pk, delta=task.points,
+                                   reason=PointsEntry.TASK, task_id=task.pk,
+                                   table_id=task.table_id_id)]
+
+            # bonus points if everyone (who can) completes the task, counted
+            # after the insert so that only the last completion sees it
+            completed = Completion.objects.filter(
+                taskoccurrence_id=occurrence.pk).count()
+            if completed == task.eligible_count:
+                entries += [
+                    PointsEntry(user_id=completer, delta=BONUS_POINTS,
+                                reason=PointsEntry.BONUS, task_id=task.pk,
+                                table_id=task.table_id_id)
+                    for completer in Completion.objects.filter(
+                        taskoccurrence_id=occurrence.pk).values_list(
+                            'coffeeuser_id', flat=True)]
+            award(entries)
+
+            # recurring tasks are set again after their interval
+            if task.recurrence_interval == "d":
+                interval = datetime.timedelta(days=1)
+            elif task.recurrence_interval == "w":
+                interval = datetime.timedelta(weeks=1)
+            else:
+                interval = None
+            if interval is not None:
+                Task.objects.filter(pk=task.pk).update(
+                    recurring_date=task.date_set + interval)
+            # read in the transaction, so that an error reading it rolls the
+            # completion back rather than hiding that it was counted
+            refresh_user(user)
+    except (NotCompleted, IntegrityError):
+        refresh_user(user)
+        return False
+    return True
+
+
+def refresh_user(user):
+    """ Reloads the counts of a user changed by completing a task
+
+    Args:
+        user::CoffeeUser
+            The user completing the task
+    """
+    user.refresh_from_db(fields=['points', 'student_tasks_completed',
+                                 'next_possible_complete'])
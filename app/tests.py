@@ -1,12 +1,75 @@
 """ Functions used for Unit Testing our web application """
 
-from django.test import SimpleTestCase, TestCase, Client
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, \
+                        Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.template.loader import render_to_string
-from app.models import CafeTable, CoffeeUser, Message, Report, Task
+from app.models import CafeTable, CoffeeUser, Message, Notification, \
+                       PointsBucket, PointsEntry, Report, Task, \
+                       TaskOccurrence
+from app.presence import count_online, record_heartbeat, users_in_table
+from app.consumers import LongPollConsumer, TableStreamConsumer, \
+                          ChatConsumer
+from app.chat import HISTORY_PAGE_SIZE, history_page, post_message, \
+                     upvote_message
+from app.message_buffer import BUFFER_SIZE, get_buffer, bump_version, \
+                              buffer_message, load_buffer
+from app.recurrence import reset_recurring_tasks
+from app.points import award
+from app.views import edit_info
+from app.leaderboard import LEADERBOARD_SIZE, WEEK_DAYS, MONTH_DAYS, \
+                            top_students, student_rank, window_leaderboard
+from app.task_completion import BONUS_POINTS, STUDENT_TASKS_PER_DAY, \
+                                record_completion
+from app.table_members import is_member, member_table_ids
+from app.studying import split_members
+from app.directory import DIRECTORY_FIELDS, table_directory
+from app.notifications import FEED_PAGE_SIZE, NOTIFICATION_DAYS, \
+                              feed_page, feed_rows, notify, \
+                              prune_notifications, unread_count
 
 client = Client()
 
 
+def clear_caches():
+    """ Empties every cache, as ids are reused between tests """
+    for alias in ('default', 'messages'):
+        caches[alias].clear()
+
+
+def query_plans(function):
+    """ Runs a function and returns the plan SQLite chose for each of the
+        queries it made, one line per step. The queries are explained with
+        their parameters bound, as constants inlined in the SQL can be
+        planned differently """
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        function()
+    plans = []
+    with connection.cursor() as cursor:
+        for sql, params in queries:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plans.append('\n'.join(row[-1] for row in cursor.fetchall()))
+    return plans
+
+
 class LogInTests(TestCase):
     """ Unit tests for login page """
     def setUp(self):
@@ -206,6 +269,7 @@ class InTableTests(TestCase):
 
     def setUp(self):
         """ Setting up test tables with content for testing """
+        clear_caches()
         table = CafeTable.objects.create(table_id='Test',
                                          university='Test uni')
         table2 = CafeTable.objects.create(table_id='Test 2',
@@ -238,9 +302,9 @@ class InTableTests(TestCase):
         }
         self.client.post('/tables/1', data)
         self.assertTrue(Message.objects.exists())
-        resp = self.client.get('/get_msgs/1')
-        response_html = resp.content.decode()
-        self.assertTrue('Test msg' in response_html)
+        data = self.client.get('/get_new_msgs/1').json()
+        self.assertEqual([msg['content'] for msg in data['messages']],
+                         ['Test msg'])
 
     def test_new_message_empty_post_data(self):
         """ Testing to see if a message with no content is correctly
@@ -260,10 +324,157 @@ class InTableTests(TestCase):
         }
         self.client.post('/tables/1', data)
         msg = Message.objects.get(message_content='Test msg')
-        self.client.get('/upvote/' + str(msg.id))
-        resp = self.client.get('/get_msgs/1')
-        response_html = resp.content.decode()
-        self.assertTrue('1 Likes' in response_html)
+        self.client.post('/upvote/' + str(msg.id))
+        data = self.client.get('/get_new_msgs/1').json()
+        self.assertEqual(data['messages'][0]['upvotes'], 1)
+
+    def test_upvote_json(self):
+        """ Testing that upvoting returns the new count and only counts a
+            user once """
+        self.client.post('/tables/1', {'message_content': 'Test msg'})
+        msg = Message.objects.get(message_content='Test msg')
+        resp = self.client.post('/upvote_json/' + str(msg.id))
+        self.assertEqual(resp.json(), {'id': msg.id, 'upvotes': 1})
+        resp = self.client.post('/upvote_json/' + str(msg.id))
+        self.assertEqual(resp.json(), {'id': msg.id, 'upvotes': 1})
+        self.assertEqual(msg.message_upvote.count(), 1)
+
+    def test_upvote_stale_count(self):
+        """ Testing that upvotes made from outdated copies of a message are
+            all counted """
+        self.client.post('/tables/1', {'message_content': 'Test msg'})
+        msg = Message.objects.get(message_content='Test msg')
+        stale = Message.objects.get(pk=msg.pk)
+        user2 = CoffeeUser.objects.create_user(
+            email='test2@test.com', first_name='testf2', last_name='testl2',
+            university='Test uni', is_staff=False, password='123'
+        )
+        user2.cafe_table_ids.add(msg.table_id)
+        upvote_message(CoffeeUser.objects.get(email='test@test.com'), msg)
+        upvote_message(user2, stale)
+        self.assertEqual(stale.total_upvotes, 2)
+        msg.refresh_from_db()
+        self.assertEqual(msg.total_upvotes, 2)
+
+    def test_upvote_json_not_part_table(self):
+        """ Testing that messages of other tables can't be upvoted """
+        table2 = CafeTable.objects.get(table_id='Test 2')
+        msg = Message.objects.create(
+            table_id=table2, message_content='Test msg',
+            created_by=CoffeeUser.objects.get(email='test@test.com'))
+        resp = self.client.post('/upvote_json/' + str(msg.id))
+        self.assertEqual(resp.status_code, 403)
+        resp = self.client.post('/upvote_json/' + str(msg.id + 1))
+        self.assertEqual(resp.status_code, 404)
+        msg.refresh_from_db()
+        self.assertEqual(msg.total_upvotes, 0)
+
+    def test_upvote_not_part_table(self):
+        """ Testing that the upvote form only upvotes messages of the user's
+            tables, and only when posted """
+        table2 = CafeTable.objects.get(table_id='Test 2')
+        msg = Message.objects.create(
+            table_id=table2, message_content='Test msg',
+            created_by=CoffeeUser.objects.get(email='test@test.com'))
+        resp = self.client.post('/upvote/' + str(msg.id))
+        self.assertTemplateUsed(resp, 'denied.html')
+        resp = self.client.post('/upvote/' + str(msg.id + 1))
+        self.assertTemplateUsed(resp, 'denied.html')
+        msg.table_id = CafeTable.objects.get(table_id='Test')
+        msg.save()
+        resp = self.client.get('/upvote/' + str(msg.id))
+        self.assertEqual(resp.status_code, 405)
+        msg.refresh_from_db()
+        self.assertEqual(msg.total_upvotes, 0)
+
+    def test_upvote_logged_out(self):
+        """ Testing that upvoting requires logging in """
+        self.client.post('/tables/1', {'message_content': 'Test msg'})
+        msg = Message.objects.get(message_content='Test msg')
+        self.client.logout()
+        resp = self.client.post('/upvote/' + str(msg.id))
+        self.assertEqual(resp.status_code, 302)
+        msg.refresh_from_db()
+        self.assertEqual(msg.total_upvotes, 0)
+
+    def test_new_msgs_since_cursor(self):
+        """ Testing that polling only returns messages newer than the cursor
+        """
+        self.client.post('/tables/1', {'message_content': 'Test msg'})
+        data = self.client.get('/get_new_msgs/1').json()
+        self.assertEqual([msg['content'] for msg in data['messages']],
+                         ['Test msg'])
+        self.assertEqual(data['messages'][0]['first_name'], 'testf')
+
+        # nothing changed since the last poll
+        cursor = {'since': data['since'], 'stamp': data['stamp']}
+        data = self.client.get('/get_new_msgs/1', cursor).json()
+        self.assertEqual(data['messages'], [])
+        self.assertEqual(data['upvotes'], {})
+
+        self.client.post('/tables/1', {'message_content': 'Test msg 2'})
+        data = self.client.get('/get_new_msgs/1', cursor).json()
+        self.assertEqual([msg['content'] for msg in data['messages']],
+                         ['Test msg 2'])
+
+    def test_new_msgs_upvote_changes(self):
+        """ Testing that upvotes on already fetched messages are returned """
+        self.client.post('/tables/1', {'message_content': 'Test msg'})
+        msg = Message.objects.get(message_content='Test msg')
+        data = self.client.get('/get_new_msgs/1').json()
+        cursor = {'since': data['since'], 'stamp': data['stamp']}
+        self.client.post('/upvote/' + str(msg.id))
+        data = self.client.get('/get_new_msgs/1', cursor).json()
+        self.assertEqual(data['messages'], [])
+        self.assertEqual(data['upvotes'], {str(msg.id): 1})
+
+    def test_new_msgs_aware_stamp(self):
+        """ Testing that a cursor stamp with a timezone is read as UTC """
+        self.client.post('/tables/1', {'message_content': 'Test msg'})
+        msg = Message.objects.get(message_content='Test msg')
+        data = self.client.get('/get_new_msgs/1').json()
+        self.client.post('/upvote/' + str(msg.id))
+        cursor = {'since': data['since'],
+                  'stamp': '2000-01-01T01:00:00+01:00'}
+        data = self.client.get('/get_new_msgs/1', cursor).json()
+        self.assertEqual(data['upvotes'], {str(msg.id): 1})
+
+    def test_new_msgs_not_part_table(self):
+        """ Testing that polling a table the user isn't part of is denied """
+        resp = self.client.get('/get_new_msgs/2')
+        self.assertEqual(resp.status_code, 403)
+
+    def test_msg_history_pages(self):
+        """ Testing that the history is paged newest first without skipping
+            messages posted at the same time """
+        table = CafeTable.objects.get(table_id='Test')
+        user = CoffeeUser.objects.get(email='test@test.com')
+        Message.objects.bulk_create([
+            Message(table_id=table, created_by=user,
+                    message_content='Msg ' + str(i))
+            for i in range(HISTORY_PAGE_SIZE * 2 + 10)])
+        # half the messages share a date, so only the id tells them apart
+        first = Message.objects.order_by('id')[HISTORY_PAGE_SIZE].id
+        Message.objects.filter(id__lt=first).update(
+            message_date=datetime.datetime(2021, 3, 1))
+        resp = self.client.get('/msg_history/1')
+        data = json.loads(resp.content)
+        self.assertEqual(data['messages'][-1]['content'],
+                         'Msg ' + str(HISTORY_PAGE_SIZE * 2 + 9))
+        ids = [msg['id'] for msg in data['messages']]
+        while data['more']:
+            oldest = data['messages'][0]
+            data = json.loads(self.client.get('/msg_history/1', {
+                'before': oldest['date'], 'before_id': oldest['id']}).content)
+            ids = [msg['id'] for msg in data['messages']] + ids
+        self.assertEqual(ids, list(Message.objects.order_by(
+            'message_date', 'id').values_list('id', flat=True)))
+
+    def test_msg_history_not_part_table(self):
+        """ Testing that the history of a table the user isn't part of is
+            denied """
+        resp = self.client.get('/msg_history/2')
+        self.assertEqual(resp.status_code, 403)
 
     def test_in_table_view_not_part_table(self):
         """ Testing to see if incorrect table view is correctly identified
@@ -287,6 +498,7 @@ class DashboardTests(TestCase):
 
     def setUp(self):
         """ Setting up test tables with content for testing """
+        clear_caches()
         table = CafeTable.objects.create(table_id='Test',
                                          university='Test uni')
         table2 = CafeTable.objects.create(table_id='Test 2',
@@ -376,6 +588,36 @@ class EditInfoTests(TestCase):
         self.assertEqual(CoffeeUser.objects.get(
             email='test@test.com').last_name, 'testlastname')
 
+    def test_join_existing_table(self):
+        """ Testing that joining a table by name uses the existing table """
+        CafeTable.objects.create(table_id='shared', university='Test uni')
+        self.client.post('/dashboard/edit_info', {'add_table_id': 'Shared'})
+        self.client.post('/dashboard/edit_info', {'add_table_id': 'new'})
+        self.assertEqual(CafeTable.objects.filter(table_id='shared').count(),
+                         1)
+        user = CoffeeUser.objects.get(email='test@test.com')
+        self.assertEqual(
+            sorted(user.cafe_table_ids.values_list('table_id', flat=True)),
+            ['Test', 'new', 'shared'])
+
+    def test_change_course(self):
+        """ Testing that changing course moves the user between the course
+            tables """
+        self.client.post('/dashboard/edit_info', {'course': 'Maths'})
+        self.client.post('/dashboard/edit_info', {'course': 'Physics'})
+        self.client.post('/dashboard/edit_info', {'remove_table_id': 'Test'})
+        user = CoffeeUser.objects.get(email='test@test.com')
+        self.assertEqual(
+            list(user.cafe_table_ids.values_list('table_id', flat=True)),
+            ['COURSE: physics'])
+        self.assertEqual(CafeTable.objects.get(
+            table_id='COURSE: maths').member_count, 0)
+
+    def test_unique_table_name(self):
+        """ Testing that a university can't have two tables of a name """
+        with self.assertRaises(IntegrityError):
+            CafeTable.objects.create(table_id='Test', university='Test uni')
+
 
 class SetTaskTests(TestCase):
     """ Unit tests for set tasks page """
@@ -480,6 +722,44 @@ class ViewTaskTests(TestCase):
         # Tasks only from the correct tables are displayed + cannot see own
         # tasks
 
+    def test_completion_counts(self):
+        """ Testing that the counts of the task listing match the counts of
+            each task """
+        student = CoffeeUser.objects.create_user(
+            email='test3@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        table = CafeTable.objects.get(table_id='Test')
+        student.cafe_table_ids.add(table)
+        Task.objects.create(task_name="tasktestStudent", table_id=table,
+                            created_by=student, task_content="lol", points=1)
+        Task.objects.get(task_name="tasktest").current_occurrence.\
+            completed_by.add(student)
+        for task in Task.objects.with_completion():
+            self.assertEqual(
+                (task.completed_count, task.eligible_count),
+                Task.objects.get(pk=task.pk).get_number_completed_task())
+        task = Task.objects.with_completion().get(task_name="tasktest")
+        self.assertEqual((task.completed_count, task.eligible_count), (1, 2))
+        task = Task.objects.with_completion().get(
+            task_name="tasktestStudent")
+        self.assertEqual((task.completed_count, task.eligible_count), (0, 1))
+
+    def test_view_tasks_queries(self):
+        """ Testing that the number of queries doesn't grow with the number
+            of tasks """
+        table = CafeTable.objects.get(table_id='Test')
+        staff = CoffeeUser.objects.get(email='test2@test.com')
+        for i in range(10):
+            Task.objects.create(task_name="tasktest" + str(i), table_id=table,
+                                created_by=staff, task_content="lol",
+                                points=1)
+        self.client.get('/view_tasks')
+        # session, user, tasks, the user's tables being cached
+        with self.assertNumQueries(3):
+            resp = self.client.get('/view_tasks')
+        self.assertContains(resp, 'tasktest9')
+
     def test_complete_task(self):
         """ Tests points earn when task completed """
         self.client.get('/complete/1')
@@ -490,6 +770,95 @@ class ViewTaskTests(TestCase):
         self.assertFalse('tasktest' in response_html)
 
 
+class RecurringTaskTests(TestCase):
+    """ Unit tests for setting recurring tasks again """
+
+    def setUp(self):
+        """ Setting up a daily task due today, completed by a student """
+        self.today = datetime.date.today()
+        table = CafeTable.objects.create(table_id='Test',
+                                         university='Test uni')
+        self.user = CoffeeUser.objects.create_user(
+            email='test@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.task = Task.objects.create(
+            task_name="tasktest", table_id=table, created_by=self.user,
+            task_content="lol", points=1, recurrence_interval="d",
+            max_repeats=2, recurring_date=self.today)
+        self.task.current_occurrence.completed_by.add(self.user)
+        # the task was last set yesterday
+        self.yesterday = self.today - datetime.timedelta(days=1)
+        TaskOccurrence.objects.update(date_set=self.yesterday)
+
+    def test_reset_due_task(self):
+        """ Testing that a due task is set again once """
+        self.assertEqual(reset_recurring_tasks(self.today), 1)
+        self.task.refresh_from_db()
+        self.assertFalse(self.task.current_occurrence.completed_by.exists())
+        self.assertEqual(self.task.current_occurrence.date_set, self.today)
+        self.assertEqual(self.task.no_of_repeats, 1)
+        self.assertEqual(self.task.date_set, self.today)
+        # yesterday's completions are kept
+        previous = self.task.occurrences.get(date_set=self.yesterday)
+        self.assertTrue(previous.completed_by.filter(pk=self.user.pk).exists())
+        # running it again the same day does nothing
+        self.assertEqual(reset_recurring_tasks(self.today), 0)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.no_of_repeats, 1)
+
+    def test_reset_missed_day(self):
+        """ Testing that a task due on a day the reset didn't run is still set
+            again """
+        Task.objects.update(recurring_date=self.yesterday)
+        self.assertEqual(reset_recurring_tasks(self.today), 1)
+
+    def test_not_due(self):
+        """ Testing that tasks not due or repeated enough are left alone """
+        Task.objects.update(recurring_date=self.today +
+                            datetime.timedelta(days=1))
+        self.assertEqual(reset_recurring_tasks(self.today), 0)
+        Task.objects.update(recurring_date=self.today, no_of_repeats=3)
+        self.assertEqual(reset_recurring_tasks(self.today), 0)
+        self.assertEqual(self.task.occurrences.count(), 1)
+
+    def test_reset_queries(self):
+        """ Testing that the number of queries doesn't grow with the number
+            of due tasks """
+        for i in range(10):
+            task = Task.objects.create(
+                task_name="tasktest", table_id=self.task.table_id,
+                created_by=self.user, task_content="lol", points=1,
+                recurrence_interval="w", max_repeats=2,
+                recurring_date=self.today)
+            task.current_occurrence.completed_by.add(self.user)
+        TaskOccurrence.objects.update(date_set=self.yesterday)
+        # savepoint, select, insert, update, release
+        with self.assertNumQueries(5):
+            self.assertEqual(reset_recurring_tasks(self.today), 11)
+
+    def test_requests_dont_reset(self):
+        """ Testing that viewing the tasks doesn't set them again """
+        self.client.login(email='test@test.com', password='123')
+        self.client.get('/view_tasks')
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.no_of_repeats, 0)
+
+    def test_reset_idempotent(self):
+        """ Testing that a task set again twice in a day keeps one occurrence
+        """
+        reset_recurring_tasks(self.today)
+        Task.objects.update(recurring_date=self.today)
+        self.assertEqual(reset_recurring_tasks(self.today), 1)
+        self.assertEqual(self.task.occurrences.count(), 2)
+
+    def test_command(self):
+        """ Testing that the command sets the due tasks again """
+        out = StringIO()
+        call_command('reset_recurring_tasks', stdout=out)
+        self.assertIn('1 recurring tasks set again', out.getvalue())
+
+
 class ReportingTests(TestCase):
     """ Unit tests for reports page """
 
@@ -612,3 +981,1256 @@ class ActiveUsersTest(TestCase):
         resp = self.client.get('/table_view')
         response_html = resp.content.decode()
         self.assertTrue('Users in Cafe: 1' in response_html)
+
+
+class PresenceTests(TestCase):
+    """ Unit tests for the heartbeats tracking who is in the cafe """
+
+    def setUp(self):
+        """ Setting up a test table with two members """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.user = CoffeeUser.objects.create_user(
+            email='test@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.user2 = CoffeeUser.objects.create_user(
+            email='test2@test.com', first_name='testf2', last_name='testl2',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.user.cafe_table_ids.add(self.table)
+        self.user2.cafe_table_ids.add(self.table)
+
+    def test_heartbeat_counted(self):
+        """ Testing that users only count once they've sent a heartbeat """
+        self.assertEqual(count_online(), 0)
+        record_heartbeat(self.user)
+        self.assertEqual(count_online(), 1)
+        record_heartbeat(self.user2)
+        self.assertEqual(count_online(), 2)
+
+    def test_heartbeat_throttled(self):
+        """ Testing that repeated heartbeats don't write to the database """
+        record_heartbeat(self.user)
+        count_online()
+        with self.assertNumQueries(0):
+            record_heartbeat(self.user)
+            count_online()
+
+    def test_logout_leaves_cafe(self):
+        """ Testing that logging out removes the user from the count """
+        self.client.login(email='test@test.com', password='123')
+        self.assertEqual(count_online(), 1)
+        self.client.get('/logout')
+        self.assertEqual(count_online(), 0)
+
+    def test_users_in_table(self):
+        """ Testing that polling a table's messages puts the user in it """
+        self.client.login(email='test@test.com', password='123')
+        self.assertFalse(users_in_table(self.table).exists())
+        self.client.get('/get_new_msgs/' + str(self.table.id))
+        self.assertEqual(list(users_in_table(self.table)), [self.user])
+
+
+class TableConsumerTests(TransactionTestCase):
+    """ Unit tests for the long-polling, streaming and WebSocket chat
+    consumers (needs real transactions as they use the database from another
+    context) """
+
+    def setUp(self):
+        """ Setting up a test table with a member """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.user = CoffeeUser.objects.create_user(
+            email='test@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.user.cafe_table_ids.add(self.table)
+
+    async def start_poll(self, query='', consumer=LongPollConsumer):
+        """ Sends a request for the test table as the test user """
+        scope = {
+            'type': 'http', 'method': 'GET', 'headers': [],
+            'path': '/wait_msgs/' + str(self.table.id),
+            'query_string': query.encode(),
+            'user': self.user,
+            'url_route': {'args': (), 'kwargs': {'table': self.table.id}},
+        }
+        communicator = ApplicationCommunicator(consumer.as_asgi(), scope)
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        return communicator
+
+    async def poll(self, query=''):
+        """ Sends a long poll and reads its response """
+        return await self.read_response(await self.start_poll(query))
+
+    def post_message(self, content):
+        """ Posts a message the same way the table_chat view does """
+        post_message(self.user, self.table, content)
+
+    @staticmethod
+    async def read_response(communicator):
+        """ Reads the status and JSON content of the response """
+        start = await communicator.receive_output(5)
+        body = await communicator.receive_output(5)
+        return start['status'], json.loads(body['body'])
+
+    def test_answers_straight_away(self):
+        """ Testing that a poll with changes to send doesn't wait """
+        self.post_message('Test msg')
+        status, data = async_to_sync(self.poll)()
+        self.assertEqual(status, 200)
+        self.assertEqual(data['messages'][0]['content'], 'Test msg')
+
+    def test_woken_by_new_message(self):
+        """ Testing that a waiting poll is answered when a message is posted
+        """
+        async def run():
+            communicator = await self.start_poll('since=0&stamp=2000-01-01')
+            # the poll is held while nothing happens
+            self.assertTrue(await communicator.receive_nothing(0.5))
+            await database_sync_to_async(self.post_message)('Test msg')
+            return await self.read_response(communicator)
+
+        status, data = async_to_sync(run)()
+        self.assertEqual(status, 200)
+        self.assertEqual(data['messages'][0]['content'], 'Test msg')
+
+    def test_denied_other_table(self):
+        """ Testing that polling a table the user isn't part of is denied """
+        self.user.cafe_table_ids.remove(self.table)
+        status, data = async_to_sync(self.poll)()
+        self.assertEqual(status, 403)
+
+    def test_stream_pushes_messages(self):
+        """ Testing that the event stream pushes new messages as they are
+        posted """
+        async def run():
+            communicator = await self.start_poll(
+                consumer=TableStreamConsumer)
+            start = await communicator.receive_output(5)
+            await communicator.receive_output(5)  # retry interval
+            await database_sync_to_async(self.post_message)('Test msg')
+            body = await communicator.receive_output(5)
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(5)
+            return start, body['body'].decode()
+
+        start, frame = async_to_sync(run)()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'Content-Type', b'text/event-stream'),
+                      start['headers'])
+        self.assertTrue(frame.startswith('event: new_message\ndata: '))
+        data = json.loads(frame.split('data: ', 1)[1])
+        self.assertEqual(data['content'], 'Test msg')
+
+    def test_stream_denied_other_table(self):
+        """ Testing that streaming a table the user isn't part of is denied
+        """
+        self.user.cafe_table_ids.remove(self.table)
+
+        async def run():
+            communicator = await self.start_poll(
+                consumer=TableStreamConsumer)
+            return await self.read_response(communicator)
+
+        status, data = async_to_sync(run)()
+        self.assertEqual(status, 403)
+
+    def open_socket(self):
+        """ Opens the chat WebSocket of the test table as the test user """
+        consumer = ChatConsumer.as_asgi()
+
+        async def application(scope, receive, send):
+            scope = dict(scope, user=self.user, url_route={
+                'args': (), 'kwargs': {'table': self.table.id}})
+            return await consumer(scope, receive, send)
+
+        return WebsocketCommunicator(application,
+                                     '/ws/tables/' + str(self.table.id))
+
+    def test_socket_post_message(self):
+        """ Testing that a message posted through the socket is saved and
+        pushed back """
+        async def run():
+            communicator = self.open_socket()
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_json_to({'action': 'post',
+                                             'content': 'Test msg'})
+            event = await communicator.receive_json_from(5)
+            await communicator.disconnect()
+            return event
+
+        event = async_to_sync(run)()
+        self.assertEqual(event['kind'], 'new_message')
+        self.assertEqual(event['data']['content'], 'Test msg')
+        self.assertTrue(Message.objects.filter(
+            message_content='Test msg', created_by=self.user).exists())
+
+    def test_socket_upvote(self):
+        """ Testing that upvoting through the socket pushes the new count """
+        msg = Message.objects.create(table_id=self.table, created_by=self.user,
+                                     message_content='Test msg')
+
+        async def run():
+            communicator = self.open_socket()
+            await communicator.connect()
+            await communicator.send_json_to({'action': 'upvote',
+                                             'id': msg.id})
+            event = await communicator.receive_json_from(5)
+            # upvoting twice doesn't change anything
+            await communicator.send_json_to({'action': 'upvote',
+                                             'id': msg.id})
+            nothing = await communicator.receive_nothing(0.2)
+            await communicator.disconnect()
+            return event, nothing
+
+        event, nothing = async_to_sync(run)()
+        self.assertEqual(event, {'kind': 'upvote',
+                                 'data': {'id': msg.id, 'upvotes': 1}})
+        self.assertTrue(nothing)
+        self.assertEqual(Message.objects.get(id=msg.id).total_upvotes, 1)
+
+    def test_socket_denied_other_table(self):
+        """ Testing that the socket of a table the user isn't part of can't
+        be opened """
+        self.user.cafe_table_ids.remove(self.table)
+
+        async def run():
+            connected, _ = await self.open_socket().connect()
+            return connected
+
+        self.assertFalse(async_to_sync(run)())
+
+
+class MessageBufferTests(TestCase):
+    """ Unit tests for the buffers of the latest messages of each table """
+
+    def setUp(self):
+        """ Setting up a test table with a message """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.user = CoffeeUser.objects.create_user(
+            email='test@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.user.cafe_table_ids.add(self.table)
+        self.msg = post_message(self.user, self.table, 'Test msg')
+
+    def test_read_from_buffer(self):
+        """ Testing that only the first read queries the database """
+        with self.assertNumQueries(1):
+            get_buffer(self.table.id)
+        with self.assertNumQueries(0):
+            messages = get_buffer(self.table.id)['messages']
+        self.assertEqual([msg['content'] for msg in messages], ['Test msg'])
+
+    def test_write_through(self):
+        """ Testing that new messages and upvotes update the buffer """
+        get_buffer(self.table.id)
+        post_message(self.user, self.table, 'Test msg 2')
+        upvote_message(self.user, self.msg)
+        with self.assertNumQueries(0):
+            buffer = get_buffer(self.table.id)
+        self.assertEqual([(msg['content'], msg['upvotes'])
+                          for msg in buffer['messages']],
+                         [('Test msg', 1), ('Test msg 2', 0)])
+        self.assertIn(self.msg.id, buffer['upvoted'])
+
+    def test_missed_write_rebuilds(self):
+        """ Testing that a buffer which missed a write is rebuilt """
+        get_buffer(self.table.id)
+        # a write made by another worker, without this buffer
+        Message.objects.create(table_id=self.table, created_by=self.user,
+                               message_content='Test msg 2')
+        bump_version(self.table.id)
+        with self.assertNumQueries(1):
+            buffer = get_buffer(self.table.id)
+        self.assertEqual(len(buffer['messages']), 2)
+
+    def test_rebuild_racing_write(self):
+        """ Testing that a message saved while the buffer was rebuilt is
+            not added to it twice """
+        version = bump_version(self.table.id)
+        # the message is saved after the version is read but before the
+        # buffer is queried, and written through once it is rebuilt
+        msg = Message.objects.create(table_id=self.table,
+                                     created_by=self.user,
+                                     message_content='Test msg 2')
+        load_buffer(self.table.id, version)
+        buffer_message(msg)
+        buffer = get_buffer(self.table.id)
+        self.assertEqual([data['id'] for data in buffer['messages']],
+                         [self.msg.id, msg.id])
+
+    def test_buffer_bounded(self):
+        """ Testing that only the latest messages are kept """
+        get_buffer(self.table.id)
+        for i in range(BUFFER_SIZE):
+            post_message(self.user, self.table, 'Msg ' + str(i))
+        buffer = get_buffer(self.table.id)
+        self.assertEqual(len(buffer['messages']), BUFFER_SIZE)
+        self.assertEqual(buffer['messages'][-1]['content'],
+                         'Msg ' + str(BUFFER_SIZE - 1))
+        self.assertFalse(buffer['complete'])
+
+
+class MessageQueryTests(TestCase):
+    """ Unit tests pinning the number of queries needed to read messages,
+        however many authors wrote them """
+
+    def setUp(self):
+        """ Setting up a test table with messages from several members """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        for i in range(10):
+            user = CoffeeUser.objects.create_user(
+                email='test' + str(i) + '@test.com', first_name='testf',
+                last_name='testl' + str(i), university='Test uni',
+                is_staff=False, password='123'
+            )
+            user.cafe_table_ids.add(self.table)
+            for j in range(5):
+                Message.objects.create(table_id=self.table, created_by=user,
+                                       message_content='Test msg')
+        self.client.login(email='test0@test.com', password='123')
+        # the first request records the user's presence
+        self.client.get('/health')
+
+    def test_get_new_msgs_queries(self):
+        """ Testing that a poll loads the authors of the messages in the same
+            query """
+        # session, user, table, membership, presence, messages
+        with self.assertNumQueries(6):
+            resp = self.client.get('/get_new_msgs/1', {'since': 1})
+        self.assertEqual(len(json.loads(resp.content)['messages']), 49)
+
+    def test_msg_history_queries(self):
+        """ Testing that a page of history loads its authors in the same
+            query """
+        # session, user, table, membership, messages
+        with self.assertNumQueries(5):
+            resp = self.client.get('/msg_history/1')
+        self.assertEqual(len(json.loads(resp.content)['messages']), 50)
+
+    def test_msg_history_plan(self):
+        """ Testing that a page far back seeks to the cursor through the
+            index instead of walking the newer messages """
+        oldest = Message.objects.order_by('message_date', 'id').first()
+        plans = query_plans(lambda: history_page(
+            self.table, (oldest.message_date, oldest.id)))
+        self.assertEqual(len(plans), 1)
+        self.assertIn('table_id_id=? AND message_date<?', plans[0])
+        self.assertNotIn('TEMP B-TREE', plans[0])
+
+
+class TableMemberCountTests(TestCase):
+    """ Unit tests for the member counts stored on the tables """
+
+    def setUp(self):
+        """ Setting up two tables, a student and a staff member """
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.table2 = CafeTable.objects.create(table_id='Test 2',
+                                               university='Test uni')
+        self.student = CoffeeUser.objects.create_user(
+            email='test@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.staff = CoffeeUser.objects.create_user(
+            email='test2@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=True, password='123'
+        )
+
+    def assertCounts(self, table, members, students):
+        """ Checks the stored counts of a table """
+        table.refresh_from_db()
+        self.assertEqual((table.member_count, table.student_count),
+                         (members, students))
+
+    def test_add_remove(self):
+        """ Testing that joining and leaving tables updates their counts """
+        self.student.cafe_table_ids.add(self.table, self.table2)
+        self.staff.cafe_table_ids.add(self.table)
+        # already a member
+        self.staff.cafe_table_ids.add(self.table)
+        self.assertCounts(self.table, 2, 1)
+        self.assertCounts(self.table2, 1, 1)
+        # not a member of table2
+        self.staff.cafe_table_ids.remove(self.table, self.table2)
+        self.assertCounts(self.table, 1, 1)
+        self.assertCounts(self.table2, 1, 1)
+        self.student.cafe_table_ids.clear()
+        self.assertCounts(self.table, 0, 0)
+        self.assertCounts(self.table2, 0, 0)
+
+    def test_reverse_side(self):
+        """ Testing that adding members from the table updates its counts """
+        self.table.coffeeuser_set.add(self.student, self.staff)
+        self.assertCounts(self.table, 2, 1)
+        self.table.coffeeuser_set.remove(self.student)
+        self.assertCounts(self.table, 1, 0)
+        self.table.coffeeuser_set.clear()
+        self.assertCounts(self.table, 0, 0)
+
+    def test_staff_change(self):
+        """ Testing that becoming staff moves a user out of the students """
+        self.student.cafe_table_ids.add(self.table)
+        self.student.is_staff = True
+        self.student.save()
+        self.assertCounts(self.table, 1, 0)
+        # saving again changes nothing
+        self.student.save()
+        self.assertCounts(self.table, 1, 0)
+        user = CoffeeUser.objects.get(pk=self.student.pk)
+        user.is_staff = False
+        user.save()
+        self.assertCounts(self.table, 1, 1)
+
+    def test_delete_user(self):
+        """ Testing that deleting a user removes them from the counts """
+        self.student.cafe_table_ids.add(self.table)
+        self.staff.cafe_table_ids.add(self.table)
+        self.student.delete()
+        self.assertCounts(self.table, 1, 0)
+
+    def test_recount_command(self):
+        """ Testing that the command repairs counts that went wrong """
+        self.student.cafe_table_ids.add(self.table)
+        self.staff.cafe_table_ids.add(self.table)
+        CafeTable.objects.update(member_count=7, student_count=5)
+        out = StringIO()
+        call_command('recount_table_members', stdout=out)
+        self.assertIn('2 tables recounted', out.getvalue())
+        self.assertCounts(self.table, 2, 1)
+        self.assertCounts(self.table2, 0, 0)
+
+
+class TaskCompletionTests(TestCase):
+    """ Unit tests for completing tasks and awarding their points """
+
+    def setUp(self):
+        """ Setting up a table of two students and a staff member, with a
+            task set by each """
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.students = []
+        for i in range(2):
+            student = CoffeeUser.objects.create_user(
+                email='test' + str(i) + '@test.com', first_name='testf',
+                last_name='testl', university='Test uni', is_staff=False,
+                password='123'
+            )
+            student.cafe_table_ids.add(self.table)
+            self.students.append(student)
+        self.staff = CoffeeUser.objects.create_user(
+            email='staff@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=True, password='123'
+        )
+        self.staff.cafe_table_ids.add(self.table)
+        self.task = Task.objects.create(
+            task_name="tasktest", table_id=self.table, created_by=self.staff,
+            task_content="lol", points=5, recurrence_interval="w",
+            max_repeats=2)
+        self.student_task = Task.objects.create(
+            task_name="tasktestStudent", table_id=self.table,
+            created_by=self.students[1], task_content="lol", points=1)
+
+    def test_complete_once(self):
+        """ Testing that completing a task twice only counts once """
+        student = self.students[0]
+        self.assertTrue(record_completion(student, self.task))
+        self.assertFalse(record_completion(student, self.task))
+        self.assertEqual(student.points, 5)
+        self.assertEqual(
+            self.task.current_occurrence.completed_by.count(), 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.recurring_date,
+                         self.task.date_set + datetime.timedelta(weeks=1))
+
+    def test_bonus_once(self):
+        """ Testing that the bonus is given to everyone once all completed """
+        for student in self.students:
+            record_completion(student, self.task)
+        # the student who completed it last tries again
+        record_completion(self.students[1], self.task)
+        for student in self.students:
+            student.refresh_from_db()
+            self.assertEqual(student.points, 5 + BONUS_POINTS)
+
+    def test_own_student_task(self):
+        """ Testing that students can't complete the tasks they set """
+        self.assertFalse(record_completion(self.students[1],
+                                           self.student_task))
+        self.assertTrue(record_completion(self.students[0],
+                                          self.student_task))
+        # the only student who could complete it gets the bonus
+        self.assertEqual(self.students[0].points, 1 + BONUS_POINTS)
+
+    def test_student_task_limit(self):
+        """ Testing that students can only complete a couple of student set
+            tasks a day, and more the next day """
+        student = self.students[0]
+        tasks = [Task.objects.create(
+            task_name="tasktest" + str(i), table_id=self.table,
+            created_by=self.students[1], task_content="lol", points=1)
+            for i in range(STUDENT_TASKS_PER_DAY + 1)]
+        for task in tasks[:-1]:
+            self.assertTrue(record_completion(student, task))
+        self.assertFalse(record_completion(student, tasks[-1]))
+        self.assertEqual(student.student_tasks_completed,
+                         STUDENT_TASKS_PER_DAY)
+        CoffeeUser.objects.filter(pk=student.pk).update(
+            next_possible_complete=datetime.date.today())
+        self.assertTrue(record_completion(student, tasks[-1]))
+        self.assertEqual(student.student_tasks_completed, 1)
+
+    def test_complete_view(self):
+        """ Testing that completing through the page notifies the table once
+        """
+        self.client.login(email='test0@test.com', password='123')
+        self.client.post('/complete/' + str(self.task.pk))
+        self.client.post('/complete/' + str(self.task.pk))
+        self.assertEqual(Notification.objects.filter(
+            table_id=self.table).count(), 1)
+
+
+class TaskCompletionStressTests(TransactionTestCase):
+    """ Stress test completing the same task from many requests at once """
+
+    def test_concurrent_completions(self):
+        """ Testing that concurrent completions, repeated clicks included,
+            give everyone their points and the bonus exactly once """
+        table = CafeTable.objects.create(table_id='Test',
+                                         university='Test uni')
+        staff = CoffeeUser.objects.create_user(
+            email='staff@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=True, password='123'
+        )
+        students = []
+        for i in range(8):
+            student = CoffeeUser.objects.create_user(
+                email='test' + str(i) + '@test.com', first_name='testf',
+                last_name='testl', university='Test uni', is_staff=False,
+                password='123'
+            )
+            student.cafe_table_ids.add(table)
+            students.append(student)
+        task = Task.objects.create(task_name="tasktest", table_id=table,
+                                   created_by=staff, task_content="lol",
+                                   points=5)
+
+        def click(student):
+            """ Completes the task like a request, clicking again if the
+                database was busy """
+            try:
+                for attempt in range(50):
+                    try:
+                        return record_completion(student, task)
+                    except OperationalError:
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        # every student clicks three times at once
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                click, [CoffeeUser.objects.get(pk=student.pk)
+                        for student in students for i in range(3)]))
+        self.assertEqual(results.count(True), len(students))
+        self.assertEqual(
+            task.current_occurrence.completed_by.count(), len(students))
+        for student in students:
+            student.refresh_from_db()
+            self.assertEqual(student.points, 5 + BONUS_POINTS)
+
+
+class PointsLedgerTests(TestCase):
+    """ Unit tests for the points ledger and the totals kept from it """
+
+    def setUp(self):
+        """ Setting up a table of two students with a staff set task """
+        table = CafeTable.objects.create(table_id='Test',
+                                         university='Test uni')
+        self.students = []
+        for i in range(2):
+            student = CoffeeUser.objects.create_user(
+                email='test' + str(i) + '@test.com', first_name='testf',
+                last_name='testl', university='Test uni', is_staff=False,
+                password='123'
+            )
+            student.cafe_table_ids.add(table)
+            self.students.append(student)
+        staff = CoffeeUser.objects.create_user(
+            email='staff@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=True, password='123'
+        )
+        self.task = Task.objects.create(
+            task_name="tasktest", table_id=table, created_by=staff,
+            task_content="lol", points=5)
+
+    def test_completion_entries(self):
+        """ Testing that completing a task records the points and bonus
+            given, adding up to the users' points """
+        for student in self.students:
+            record_completion(student, self.task)
+        self.assertEqual(
+            sorted(PointsEntry.objects.values_list('reason', 'delta')),
+            [(PointsEntry.TASK, 5), (PointsEntry.TASK, 5),
+             (PointsEntry.BONUS, BONUS_POINTS),
+             (PointsEntry.BONUS, BONUS_POINTS)])
+        for student in self.students:
+            student.refresh_from_db()
+            self.assertEqual(student.points, sum(
+                student.points_entries.values_list('delta', flat=True)))
+
+    def test_award_queries(self):
+        """ Testing that awarding points to many users is one insert and an
+            update for each different number of points """
+        entries = [PointsEntry(user=student, delta=3, reason=PointsEntry.TASK)
+                   for student in self.students]
+        entries.append(PointsEntry(user=self.students[0], delta=1,
+                                   reason=PointsEntry.BONUS))
+        with self.assertNumQueries(3):
+            award(entries)
+        self.assertEqual(
+            list(CoffeeUser.objects.filter(is_staff=False).order_by(
+                'pk').values_list('points', flat=True)), [4, 3])
+
+    def test_edit_keeps_points(self):
+        """ Testing that editing details with the user loaded before points
+            were earned doesn't undo the points """
+        student = CoffeeUser.objects.get(pk=self.students[0].pk)
+        award([PointsEntry(user=self.students[0], delta=5,
+                           reason=PointsEntry.TASK)])
+        request = RequestFactory().post('/dashboard/edit_info',
+                                        {'last_name': 'renamed'})
+        request.user = student
+        edit_info(request)
+        self.assertEqual(
+            CoffeeUser.objects.filter(pk=student.pk).values_list(
+                'last_name', 'points').get(), ('renamed', 5))
+
+    def test_rebuild_command(self):
+        """ Testing that the command recomputes the totals from the ledger """
+        award([PointsEntry(user=self.students[0], delta=7,
+                           reason=PointsEntry.TASK)])
+        CoffeeUser.objects.update(points=100)
+        out = StringIO()
+        call_command('rebuild_points', stdout=out)
+        self.assertIn('3 point totals rebuilt', out.getvalue())
+        self.assertEqual(
+            list(CoffeeUser.objects.order_by('pk').values_list(
+                'points', flat=True)), [7, 0, 0])
+
+
+class LeaderboardTests(TestCase):
+    """ Unit tests for the leaderboard of the highest scoring students """
+
+    def setUp(self):
+        """ Setting up students with different points and a staff member """
+        clear_caches()
+        for i in range(LEADERBOARD_SIZE + 2):
+            CoffeeUser.objects.create_user(
+                email='test' + str(i) + '@test.com', first_name='testf',
+                last_name='testl' + str(i), university='Test uni',
+                is_staff=False, password='123'
+            )
+        CoffeeUser.objects.filter(email='test1@test.com').update(points=50)
+        CoffeeUser.objects.filter(email='test2@test.com').update(points=20)
+        CoffeeUser.objects.filter(email='test3@test.com').update(points=20)
+        CoffeeUser.objects.create_user(
+            email='staff@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=True, password='123'
+        )
+        CoffeeUser.objects.filter(is_staff=True).update(points=100)
+
+    def test_top_students(self):
+        """ Testing that the board holds the best students, best first """
+        students = top_students()
+        self.assertEqual(len(students), LEADERBOARD_SIZE)
+        # students with the same points are listed newest first
+        self.assertEqual([student['last_name'] for student in students[:3]],
+                         ['testl1', 'testl3', 'testl2'])
+        self.assertEqual(students[0]['points'], 50)
+
+    def test_board_cached(self):
+        """ Testing that the board is cached until points change """
+        top_students()
+        with self.assertNumQueries(0):
+            top_students()
+        student = CoffeeUser.objects.get(email='test4@test.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            award([PointsEntry(user=student, delta=60,
+                               reason=PointsEntry.TASK)])
+        self.assertEqual(top_students()[0]['last_name'], 'testl4')
+
+    def test_student_rank(self):
+        """ Testing that students with the same points share a position """
+        ranks = [student_rank(CoffeeUser.objects.get(
+            email='test' + str(i) + '@test.com')) for i in range(5)]
+        self.assertEqual(ranks, [4, 1, 2, 2, 4])
+
+    def test_index_plans(self):
+        """ Testing that the board and the rank seek through the
+            (is_staff, points) index instead of sorting every student """
+        student = CoffeeUser.objects.get(email='test2@test.com')
+        plans = query_plans(top_students) + \
+            query_plans(lambda: student_rank(student))
+        self.assertEqual(len(plans), 2)
+        for plan in plans:
+            self.assertIn('SEARCH', plan)
+            self.assertIn('is_staff=?', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_dashboard_rank(self):
+        """ Testing that the dashboard shows the student's position """
+        self.client.login(email='test2@test.com', password='123')
+        resp = self.client.get('/dashboard')
+        self.assertContains(resp, 'Your position: 2')
+
+
+class WindowLeaderboardTests(TestCase):
+    """ Unit tests for the leaderboards of the last week and month """
+
+    def setUp(self):
+        """ Setting up two tables and three students, one of another
+            university """
+        self.today = datetime.date.today()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.table2 = CafeTable.objects.create(table_id='Test 2',
+                                               university='Test uni')
+        self.students = [CoffeeUser.objects.create_user(
+            email='test' + str(i) + '@test.com', first_name='testf',
+            last_name='testl' + str(i), university='Test uni',
+            is_staff=False, password='123'
+        ) for i in range(3)]
+        CoffeeUser.objects.filter(pk=self.students[2].pk).update(
+            university='Other uni')
+
+    def earn(self, student, points, table, days_ago=0):
+        """ Gives points earned in a table some days ago """
+        date = datetime.datetime.now() - datetime.timedelta(days=days_ago)
+        award([PointsEntry(user=student, delta=points, table=table,
+                           reason=PointsEntry.TASK, date=date)])
+
+    def test_windows(self):
+        """ Testing that the boards only count the points of their days """
+        self.earn(self.students[0], 5, self.table)
+        self.earn(self.students[1], 8, self.table, days_ago=10)
+        self.earn(self.students[1], 1, self.table2, days_ago=1)
+        week = window_leaderboard(WEEK_DAYS)
+        self.assertEqual([(s['last_name'], s['points']) for s in week],
+                         [('testl0', 5), ('testl1', 1)])
+        month = window_leaderboard(MONTH_DAYS)
+        self.assertEqual([(s['last_name'], s['points']) for s in month],
+                         [('testl1', 9), ('testl0', 5)])
+
+    def test_table_and_university(self):
+        """ Testing that the boards of a table or university only count the
+            points earned there """
+        self.earn(self.students[0], 5, self.table)
+        self.earn(self.students[1], 8, self.table2)
+        self.earn(self.students[2], 9, self.table)
+        board = window_leaderboard(WEEK_DAYS, table=self.table)
+        self.assertEqual([s['last_name'] for s in board],
+                         ['testl2', 'testl0'])
+        board = window_leaderboard(WEEK_DAYS, university='Test uni')
+        self.assertEqual([s['last_name'] for s in board],
+                         ['testl1', 'testl0'])
+
+    def test_incremental_buckets(self):
+        """ Testing that points earned the same day share a bucket """
+        for i in range(3):
+            self.earn(self.students[0], 2, self.table)
+        bucket = PointsBucket.objects.get()
+        self.assertEqual((bucket.day, bucket.points), (self.today, 6))
+        with self.assertNumQueries(1):
+            window_leaderboard(WEEK_DAYS, table=self.table)
+
+    def test_completion_buckets(self):
+        """ Testing that completing a task adds its points to the table's
+            board """
+        staff = CoffeeUser.objects.create_user(
+            email='staff@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=True, password='123'
+        )
+        self.students[0].cafe_table_ids.add(self.table)
+        self.students[1].cafe_table_ids.add(self.table)
+        task = Task.objects.create(task_name="tasktest", table_id=self.table,
+                                   created_by=staff, task_content="lol",
+                                   points=5)
+        record_completion(self.students[0], task)
+        board = window_leaderboard(WEEK_DAYS, table=self.table)
+        self.assertEqual([(s['last_name'], s['points']) for s in board],
+                         [('testl0', 5)])
+
+    def test_compact_and_rebuild(self):
+        """ Testing that the daily run drops expired buckets and rebuilds
+            closed days from the ledger """
+        self.earn(self.students[0], 5, self.table, days_ago=1)
+        self.earn(self.students[0], 3, self.table, days_ago=1)
+        self.earn(self.students[1], 4, self.table, days_ago=MONTH_DAYS)
+        PointsBucket.objects.update(points=100)
+        out = StringIO()
+        call_command('compact_leaderboards', stdout=out)
+        self.assertIn('1 buckets rebuilt, 1 dropped', out.getvalue())
+        self.assertEqual(
+            list(PointsBucket.objects.values_list('user', 'points')),
+            [(self.students[0].pk, 8)])
+
+
+class NotificationFeedTests(TestCase):
+    """ Unit tests for the notification feed and unread count """
+
+    def setUp(self):
+        """ Setting up a student in one of two tables, with notifications
+            posted in both """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.table2 = CafeTable.objects.create(table_id='Test 2',
+                                               university='Test uni')
+        self.user = CoffeeUser.objects.create_user(
+            email='test@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.user.cafe_table_ids.add(self.table)
+        # created out of date order, some at the same time
+        now = datetime.datetime.now()
+        self.notifications = []
+        for i in range(FEED_PAGE_SIZE + 5):
+            notification = Notification.objects.create(
+                table_id=self.table, notification_type=3,
+                text_preview='notif ' + str(i))
+            self.notifications.append(notification)
+        dates = [now - datetime.timedelta(minutes=(i * 7) % 5)
+                 for i in range(len(self.notifications))]
+        for notification, date in zip(self.notifications, dates):
+            notification.date = date
+            Notification.objects.filter(pk=notification.pk).update(date=date)
+        Notification.objects.create(table_id=self.table2,
+                                    notification_type=3,
+                                    text_preview='other table')
+        self.client.login(email='test@test.com', password='123')
+
+    def newest_first(self):
+        """ Returns the ids of the user's notifications, newest first """
+        return [n.id for n in sorted(self.notifications,
+                                     key=lambda n: (n.date, n.id),
+                                     reverse=True)]
+
+    def test_newest_first(self):
+        """ Testing that the first page has the newest notifications of the
+            user's tables only """
+        member_table_ids(self.user)
+        with self.assertNumQueries(1):
+            page = feed_page(feed_rows(self.user, None))
+        self.assertEqual([n['id'] for n in page['notifications']],
+                         self.newest_first()[:FEED_PAGE_SIZE])
+        self.assertTrue(page['more'])
+
+    def test_pages(self):
+        """ Testing that paging with the cursor from the JSON feed goes
+            through every notification once """
+        ids = []
+        params = {}
+        while True:
+            resp = self.client.get('/notifications', params)
+            self.assertEqual(resp.status_code, 200)
+            data = json.loads(resp.content)
+            ids += [n['id'] for n in data['notifications']]
+            if not data['more']:
+                break
+            oldest = data['notifications'][-1]
+            params = {'before': oldest['date'], 'before_id': oldest['id']}
+        self.assertEqual(ids, self.newest_first())
+
+    def test_page_plan(self):
+        """ Testing that a later page of a user in several tables seeks to
+            the cursor through the index of each table """
+        self.user.cafe_table_ids.add(self.table2)
+        oldest = self.notifications[-1]
+        plans = query_plans(lambda: feed_rows(self.user,
+                                              (oldest.date, oldest.id)))
+        self.assertIn('date<?', plans[-1])
+        self.assertNotIn('MULTI-INDEX OR', plans[-1])
+
+    def test_login_required(self):
+        """ Testing that the feed isn't sent to anonymous users """
+        self.client.logout()
+        resp = self.client.get('/notifications')
+        self.assertEqual(resp.status_code, 302)
+
+    def test_dashboard(self):
+        """ Testing that the dashboard shows the newest notifications and
+            marks them as read """
+        self.assertEqual(unread_count(self.user), FEED_PAGE_SIZE + 5)
+        resp = self.client.get('/dashboard')
+        self.assertEqual([n['id'] for n in resp.context['notifications']],
+                         self.newest_first()[:FEED_PAGE_SIZE])
+        self.assertTrue(resp.context['more_notifications'])
+        self.user.refresh_from_db()
+        self.assertEqual(unread_count(self.user), 0)
+        clear_caches()
+        self.assertEqual(unread_count(self.user), 0)
+        Notification.objects.create(table_id=self.table, notification_type=3,
+                                    text_preview='new')
+        clear_caches()
+        self.assertEqual(unread_count(self.user), 1)
+
+    def test_unread_count_cached(self):
+        """ Testing that the unread count is shown on other pages and only
+            counted once while cached """
+        resp = self.client.get('/table_view')
+        self.assertIn('Notifications: ' + str(FEED_PAGE_SIZE + 5),
+                      resp.content.decode())
+        with self.assertNumQueries(0):
+            unread_count(self.user)
+
+
+class NotificationCoalescingTests(TestCase):
+    """ Unit tests for coalescing and pruning notifications """
+
+    def setUp(self):
+        """ Setting up a table with a student and a staff member """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.student = CoffeeUser.objects.create_user(
+            email='test@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.staff = CoffeeUser.objects.create_user(
+            email='staff@test.com', first_name='stafff', last_name='staffl',
+            university='Test uni', is_staff=True, password='123'
+        )
+        self.student.cafe_table_ids.add(self.table)
+
+    def test_coalesce(self):
+        """ Testing that events about the same subject are coalesced, and
+            only within the window """
+        for i in range(3):
+            notify(self.table.pk, 3, 'completed:1', 'done ' + str(i))
+        notify(self.table.pk, 3, 'completed:2', 'other task')
+        notification = Notification.objects.get(subject='completed:1')
+        self.assertEqual((notification.times, notification.text_preview),
+                         (3, 'done 2'))
+        Notification.objects.update(
+            date=datetime.datetime.now() - datetime.timedelta(hours=2))
+        notify(self.table.pk, 3, 'completed:1', 'later')
+        self.assertEqual(Notification.objects.filter(
+            subject='completed:1').count(), 2)
+
+    def test_near_collectable(self):
+        """ Testing that the table is told once when a student gets close to
+            their next collectable, when earning points """
+        task = Task.objects.create(task_name="tasktest", table_id=self.table,
+                                   created_by=self.staff, task_content="lol",
+                                   points=45)
+        record_completion(self.student, task)
+        notification = Notification.objects.get(notification_type=1)
+        self.assertEqual(notification.subject,
+                         'collectable:%d' % self.student.pk)
+        award([PointsEntry(user=self.student, delta=1, table=self.table,
+                           reason=PointsEntry.TASK)])
+        self.assertEqual(Notification.objects.get(
+            notification_type=1).times, 1)
+
+    def test_dashboard_read_only(self):
+        """ Testing that loading the dashboard doesn't write, even close to
+            the next collectable """
+        CoffeeUser.objects.filter(pk=self.student.pk).update(points=45)
+        Notification.objects.create(table_id=self.table, notification_type=3,
+                                    text_preview='new')
+        self.client.login(email='test@test.com', password='123')
+        self.client.get('/dashboard')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/dashboard')
+        self.assertFalse([q for q in queries.captured_queries
+                          if not q['sql'].startswith('SELECT')])
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_prune(self):
+        """ Testing that notifications older than NOTIFICATION_DAYS are
+            deleted by the daily command """
+        old = Notification.objects.create(table_id=self.table,
+                                          notification_type=3)
+        Notification.objects.filter(pk=old.pk).update(
+            date=datetime.datetime.now() -
+            datetime.timedelta(days=NOTIFICATION_DAYS + 1))
+        Notification.objects.create(table_id=self.table, notification_type=3)
+        out = StringIO()
+        call_command('prune_notifications', stdout=out)
+        self.assertIn('1 notifications pruned', out.getvalue())
+        self.assertFalse(Notification.objects.filter(pk=old.pk).exists())
+        self.assertEqual(prune_notifications(), 0)
+
+
+class MembershipCacheTests(TestCase):
+    """ Unit tests for the cached tables of each user """
+
+    def setUp(self):
+        """ Setting up a student in one of two tables """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='test',
+                                              university='Test uni')
+        self.table2 = CafeTable.objects.create(table_id='test 2',
+                                               university='Test uni')
+        self.user = CoffeeUser.objects.create_user(
+            email='test@test.com', first_name='testf', last_name='testl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.user.cafe_table_ids.add(self.table)
+        self.client.login(email='test@test.com', password='123')
+
+    def test_cached(self):
+        """ Testing that a user's tables are read once, then shared between
+            requests """
+        with self.assertNumQueries(1):
+            self.assertTrue(is_member(self.user, self.table.pk))
+            self.assertFalse(is_member(self.user, self.table2.pk))
+        user = CoffeeUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(member_table_ids(user), {self.table.pk})
+
+    def test_other_university(self):
+        """ Testing that only the tables of the user's university count """
+        other = CafeTable.objects.create(table_id='test',
+                                         university='Other uni')
+        self.user.cafe_table_ids.add(other)
+        self.assertFalse(is_member(self.user, other.pk))
+
+    def test_denied_without_loading(self):
+        """ Testing that polling a table the user isn't part of is denied
+            from the cache """
+        self.client.get('/get_new_msgs/' + str(self.table.pk))
+        # session, user
+        with self.assertNumQueries(2):
+            resp = self.client.get('/get_new_msgs/' + str(self.table2.pk))
+        self.assertEqual(resp.status_code, 403)
+
+    def test_edit_info_invalidates(self):
+        """ Testing that joining and leaving tables from the edit info page
+            is seen at once """
+        member_table_ids(self.user)
+        self.client.post('/dashboard/edit_info', {'add_table_id': 'test 2'})
+        self.assertEqual(member_table_ids(
+            CoffeeUser.objects.get(pk=self.user.pk)),
+            {self.table.pk, self.table2.pk})
+        resp = self.client.get('/tables/' + str(self.table2.pk))
+        self.assertTemplateUsed(resp, 'table_chat.html')
+        self.client.post('/dashboard/edit_info', {'remove_table_id': 'test'})
+        resp = self.client.get('/tables/' + str(self.table.pk))
+        self.assertTemplateUsed(resp, 'denied.html')
+
+    def test_table_side_invalidates(self):
+        """ Testing that changing members from the table or deleting it
+            drops the cached tables """
+        member_table_ids(self.user)
+        self.table2.coffeeuser_set.add(self.user)
+        self.assertTrue(is_member(CoffeeUser.objects.get(pk=self.user.pk),
+                                  self.table2.pk))
+        self.table2.coffeeuser_set.clear()
+        self.assertFalse(is_member(CoffeeUser.objects.get(pk=self.user.pk),
+                                   self.table2.pk))
+        self.table.delete()
+        self.assertEqual(member_table_ids(
+            CoffeeUser.objects.get(pk=self.user.pk)), set())
+
+
+class StudyingTests(TestCase):
+    """ Unit tests for showing which members are studying """
+
+    def setUp(self):
+        """ Setting up a table of three students, one studying and one whose
+            study break is over """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        now = datetime.datetime.now()
+        self.students = []
+        for i, until in enumerate((now + datetime.timedelta(hours=1),
+                                   now - datetime.timedelta(hours=1), None)):
+            student = CoffeeUser.objects.create_user(
+                email='test' + str(i) + '@test.com', first_name='testf',
+                last_name='testl' + str(i), university='Test uni',
+                is_staff=False, password='123'
+            )
+            student.cafe_table_ids.add(self.table)
+            CoffeeUser.objects.filter(pk=student.pk).update(
+                studying_until=until)
+            self.students.append(student)
+        self.client.login(email='test0@test.com', password='123')
+
+    def test_split(self):
+        """ Testing that only study breaks lasting past now count """
+        studying, others = split_members(self.table)
+        self.assertEqual([user['id'] for user in studying],
+                         [self.students[0].pk])
+        self.assertEqual(sorted(user['id'] for user in others),
+                         [self.students[1].pk, self.students[2].pk])
+
+    def test_pages_read_only(self):
+        """ Testing that showing the table and dashboard doesn't write, even
+            with a study break over """
+        self.client.login(email='test1@test.com', password='123')
+        self.client.get('/tables/' + str(self.table.pk))
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get('/tables/' + str(self.table.pk))
+            self.client.get('/dashboard')
+        self.assertFalse([q for q in queries.captured_queries
+                          if not q['sql'].startswith('SELECT')])
+        self.assertEqual(sorted(user['id']
+                                for user in resp.context['other_users']),
+                         [self.students[1].pk, self.students[2].pk])
+
+    def test_clear(self):
+        """ Testing that the sweep clears the study breaks that are over """
+        out = StringIO()
+        call_command('clear_study_breaks', stdout=out)
+        self.assertIn('1 study breaks cleared', out.getvalue())
+        self.assertEqual(
+            list(CoffeeUser.objects.filter(studying_until__isnull=False)
+                 .values_list('pk', flat=True)), [self.students[0].pk])
+
+
+class UserDirectoryTests(TestCase):
+    """ Unit tests for the cached members shown on the pages of a table """
+
+    def setUp(self):
+        """ Setting up a table of two students, with a task set by a staff
+            member who isn't part of it """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.students = []
+        for i in range(2):
+            student = CoffeeUser.objects.create_user(
+                email='test' + str(i) + '@test.com', first_name='testf',
+                last_name='testl' + str(i), university='Test uni',
+                is_staff=False, password='123'
+            )
+            student.cafe_table_ids.add(self.table)
+            self.students.append(student)
+        self.outsider = CoffeeUser.objects.create_user(
+            email='other@test.com', first_name='otherf', last_name='otherl',
+            university='Test uni', is_staff=False, password='123'
+        )
+        self.staff = CoffeeUser.objects.create_user(
+            email='staff@test.com', first_name='stafff', last_name='staffl',
+            university='Test uni', is_staff=True, password='123'
+        )
+        Task.objects.create(task_name="tasktest", table_id=self.table,
+                            created_by=self.staff, task_content="lol",
+                            points=1)
+        self.client.login(email='test0@test.com', password='123')
+
+    def test_scoped(self):
+        """ Testing that only the members of the table are loaded, with the
+            columns shown """
+        members = table_directory(self.table.pk)
+        self.assertEqual([member['last_name'] for member in members],
+                         ['testl0', 'testl1'])
+        self.assertEqual(set(members[0]), set(DIRECTORY_FIELDS))
+        with self.assertNumQueries(0):
+            table_directory(self.table.pk)
+
+    def test_table_page(self):
+        """ Testing that the table page shows the members and the creators
+            of the tasks from the cache """
+        self.client.get('/tables/' + str(self.table.pk))
+        resp = self.client.get('/tables/' + str(self.table.pk))
+        self.assertNotIn('users', resp.context)
+        self.assertContains(resp, 'testl1')
+        self.assertContains(resp, 'set by stafff staffl')
+        self.assertNotContains(resp, 'otherl')
+
+    def test_view_tasks_creators(self):
+        """ Testing that the creators of tasks are read once """
+        self.client.get('/view_tasks')
+        with self.assertNumQueries(3):
+            resp = self.client.get('/view_tasks')
+        self.assertContains(resp, 'stafff staffl')
+
+    def test_invalidated(self):
+        """ Testing that joining, renaming and study breaks show up at once
+        """
+        table_directory(self.table.pk)
+        self.outsider.cafe_table_ids.add(self.table)
+        self.assertIn('otherl', [member['last_name'] for member in
+                                 table_directory(self.table.pk)])
+        self.client.post('/dashboard/edit_info', {'last_name': 'renamed'})
+        self.assertIn('renamed', [member['last_name'] for member in
+                                  table_directory(self.table.pk)])
+        self.client.post('/dashboard', {'minutes_studying_for': 30})
+        studying, _ = split_members(self.table)
+        self.assertEqual([user['id'] for user in studying],
+                         [self.students[0].pk])
+
+
+class DashboardCacheTests(TestCase):
+    """ Unit tests for the cached parts of the dashboard """
+
+    def setUp(self):
+        """ Setting up a table of two students with a staff set task """
+        clear_caches()
+        self.table = CafeTable.objects.create(table_id='Test',
+                                              university='Test uni')
+        self.staff = CoffeeUser.objects.create_user(
+            email='staff@test.com', first_name='stafff', last_name='staffl',
+            university='Test uni', is_staff=True, password='123'
+        )
+        self.students = []
+        for i in range(2):
+            student = CoffeeUser.objects.create_user(
+                email='test' + str(i) + '@test.com', first_name='testf',
+                last_name='testl' + str(i), university='Test uni',
+                is_staff=False, password='123'
+            )
+            student.cafe_table_ids.add(self.table)
+            self.students.append(student)
+        self.task = Task.objects.create(task_name="tasktest",
+                                        table_id=self.table,
+                                        created_by=self.staff,
+                                        task_content="lol", points=5)
+        self.client.login(email='test0@test.com', password='123')
+
+    def test_warm_dashboard(self):
+        """ Testing that a warm dashboard only loads the session and user """
+        notify(self.table.pk, 3, 'set:1', 'new task')
+        self.client.get('/dashboard')
+        with self.assertNumQueries(2):
+            resp = self.client.get('/dashboard')
+        self.assertEqual(len(resp.context['notifications']), 1)
+
+    def test_notifications_bumped(self):
+        """ Testing that a notification posted to the user's table shows at
+            once """
+        self.client.get('/dashboard')
+        notify(self.table.pk, 3, 'set:1', 'new task')
+        resp = self.client.get('/dashboard')
+        self.assertEqual([n['text_preview']
+                          for n in resp.context['notifications']],
+                         ['new task'])
+
+    def test_points_bumped(self):
+        """ Testing that completing a task updates the boards and the rank
+        """
+        resp = self.client.get('/dashboard')
+        self.assertEqual(resp.context['weekly_users'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            record_completion(self.students[1], self.task)
+        resp = self.client.get('/dashboard')
+        self.assertEqual([s['last_name'] for s in resp.context['users']],
+                         ['testl1', 'testl0'])
+        self.assertEqual([s['last_name']
+                          for s in resp.context['weekly_users']],
+                         ['testl1'])
+        self.assertEqual(resp.context['rank'], 2)
@@ -13,8 +13,13 @@ urlpatterns = [
                path('table_view', views.table_view, name='table_view'),
                path('tables/<pk>', views.table_chat,
                     name='table_chat'),
-               path('get_msgs/<table>', views.get_msgs, name='get_msgs'),
+               path('get_new_msgs/<table>', views.get_new_msgs,
+                    name='get_new_msgs'),
+               path('msg_history/<table>', views.get_msg_history,
+                    name='msg_history'),
                path('upvote/<pk>', views.upvote, name='upvote_message'),
+               path('upvote_json/<pk>', views.upvote_json,
+                    name='upvote_json'),
                path('dashboard/edit_info', views.edit_info, name='edit_info'),
                path('health', views.health, name='health'),
                path('404', views.handler404, name='404'),
@@ -25,6 +30,8 @@ urlpatterns = [
                path('view_tasks', views.view_tasks, name='viewtasks'),
                path('complete/<pk>', views.complete_task, name='complete'),
                path('dashboard', views.dashboard, name='dashboard'),
+               path('notifications', views.get_notifications,
+                    name='notifications'),
                path('profile_page/<pk>', views.profile_page,
                     name='profile_page'),
                path('favicon.ico',
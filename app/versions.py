@@ -0,0 +1,63 @@
+""" Versions of what cached data is built from. Data cached under the
+versions it was built from is out of date as soon as a write bumps one of
+them, without having to find and delete it """
+
+import random
+from django.core.cache import cache
+from django.db import transaction
+
+# the version bumped when anyone's points change
+POINTS = 'points'
+
+
+def version_key(name):
+    """ Returns the cache key of a version """
+    return 'version:%s' % name
+
+
+def feed_version(table_pk):
+    """ Returns the name of the version of a table's notifications """
+    return 'feed:%d' % table_pk
+
+
+def read_versions(names):
+    """ Reads the current versions of what some cached data is built from
+
+    Args:
+        names::list
+            The names of the versions
+
+    Returns:
+        versions::list
+            The versions, in the same order
+    """
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # start at a random version, so data that outlived an evicted
+            # version isn't taken as up to date
+            cache.add(key, random.randint(0, 2 ** 30), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(names):
+    """ Marks that what some cached data is built from changed, now and
+        again once committed, so that a read meanwhile can't be cached as
+        current
+
+    Args:
+        names::list
+            The names of the versions
+    """
+    def bump_now():
+        for name in names:
+            try:
+                cache.incr(version_key(name))
+            except ValueError:
+                # never read, or evicted, so nothing cached depends on it
+                pass
+
+    bump_now()
+    transaction.on_commit(bump_now)
@@ -1,21 +1,30 @@
 """ Functions called when navigating to a specific page in the web app """
 
 from __future__ import unicode_literals
-from operator import attrgetter
 import datetime
 import pytz
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
-from django.contrib.sessions.models import Session
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
-from django.utils import timezone
+from django.views.decorators.http import require_POST
 from app.forms import SignUpForm, LoginForm, PostMessageForm, CUserEditForm, \
                    CreateTaskForm, StudyBreaksForm, CUserEditFormStaff, \
                    ReportForm
-from app.models import CoffeeUser, CafeTable, Message, Task, Report, \
-                       Notification
+from app.models import CoffeeUser, CafeTable, Message, Task, Report
 from app.small_scripts_def import check_points_treshold, how_much_to_go
+from app.presence import count_online
+from app.events import publish
+from app.chat import table_for_user, new_msgs_data, read_history_cursor, \
+                     history_page, post_message, upvote_message
+from app.task_completion import record_completion
+from app.leaderboard import WEEK_DAYS, window_leaderboard
+from app.notifications import feed_rows, feed_page, mark_read, notify
+from app.table_members import member_table_ids, member_tables
+from app.studying import is_studying, split_members
+from app.directory import member_changed, task_creators
+from app.dashboard import cached_leaderboards, cached_notifications, \
+                          cached_rank
 
 
 list_coffee_link = ["images/espresso.PNG", "images/americano.PNG",
@@ -27,6 +36,10 @@ list_coffee_name = ["Espresso", "Americano", "Cappuccino", "Hot Chocolate",
                     "Latte", "Mocha", "Matcha Latte", "Frappuccino",
                     "Iced Tea", "Bubble Tea"]
 
+# the fields of a user changed through the edit info form
+EDITABLE_DETAILS = ['first_name', 'last_name', 'course', 'facebook',
+                    'instagram', 'twitter', 'share_tables', 'year']
+
 
 # Isabel 3/3/21
 def get_number_current_users():
@@ -36,66 +49,72 @@ def get_number_current_users():
         active::int
             The number of users currently using the web app
     """
-    active_sessions = Session.objects.filter(expire_date__gte=timezone.now())
-    active = 0
-    for session in active_sessions:
-        data = session.get_decoded()
-        if data != {}:
-            active += 1
-    return active
+    return count_online()
 
 
-# Isabel 3/3/21
+# polled by the chat page, only sends what changed since the last poll
 @login_required(login_url='/')
-def get_msgs(request, table):
-    """ Retrieves all messages in a specific table and renders them
+def get_new_msgs(request, table):
+    """ Retrieves the messages posted and the upvote counts changed in a
+        specific table since the client last polled it
 
     Args:
         request::HttpRequest
-            Object that contains metadata about the request
+            Object that contains metadata about the request, with the
+            cursor returned by the previous poll as parameters
         table::int
             The id of the table where the specific messages are written
 
     Returns:
-        render::HttpResponse
-            Renders the 'messages.html' file and passes the retireved messages
-            as a parameter
+        JsonResponse
+            The new messages, the changed upvote counts and the cursor to
+            send with the next poll
     """
-    # deal with if the requested table doesn't exist
-    try:
-        table = CafeTable.objects.get(pk=table)
-    except CafeTable.DoesNotExist:
-        return render(request, 'denied.html')
-    # make sure user can only access their tables
-    current_user = request.user
-    if ((current_user.university != table.university) or
-       (table.table_id not in
-       current_user.cafe_table_ids.values_list('table_id', flat=True))):
-        return render(request, 'denied.html')
+    data = new_msgs_data(request.user, table, request.GET)
+    if data is None:
+        return JsonResponse({'status': 'denied'}, status=403)
+    return JsonResponse(data)
+
+
+@login_required(login_url='/')
+def get_msg_history(request, table):
+    """ Retrieves a page of the messages posted in a specific table before the
+        oldest message the client has, or the newest page without a cursor
+
+    Args:
+        request::HttpRequest
+            Object that contains metadata about the request, with the date
+            and id of the oldest message the client has as parameters
+        table::int
+            The id of the table where the specific messages are written
 
-    # get the 100 most recent messages in the table
-    messages = Message.objects.filter(table_id=table).order_by(
-                'message_date')[:100]
+    Returns:
+        JsonResponse
+            The older messages, oldest first, and whether there are more
+    """
+    table = table_for_user(request.user, table)
+    if table is None:
+        return JsonResponse({'status': 'denied'}, status=403)
+    return JsonResponse(history_page(table, read_history_cursor(request.GET)))
 
-    # format the times so they can be processed in JS for timezone conversion
-    for msg in messages:
-        msg.message_date = pytz.utc.localize(msg.message_date).isoformat()
-    return render(request, 'messages.html', {'messages': messages})
 
+@login_required(login_url='/')
+def get_notifications(request):
+    """ Retrieves a page of the notifications of the user's tables older than
+        the oldest notification the client has, or the newest page without a
+        cursor
 
-def check_recurring_tasks():
-    """ Checks whether a recurring task exists and repeat if necessary"""
-    # get recurring tasks that still must be repeated
-    recurring_tasks = Task.objects.exclude(max_repeats=0).exclude(
-        recurrence_interval="n")
-    for task in recurring_tasks:
-        # set the task again if necessary
-        if task.recurring_date == datetime.date.today() and \
-          task.no_of_repeats <= task.max_repeats:
-            task.completed_by.remove(*task.completed_by.all())
-            task.no_of_repeats += 1
-            task.date_set = datetime.date.today()
-            task.save()
+    Args:
+        request::HttpRequest
+            Object that contains metadata about the request, with the date
+            and id of the oldest notification the client has as parameters
+
+    Returns:
+        JsonResponse
+            The older notifications, newest first, and whether there are more
+    """
+    rows = feed_rows(request.user, read_history_cursor(request.GET))
+    return JsonResponse(feed_page(rows))
 
 
 # Victoria: 18/2/21
@@ -209,11 +228,7 @@ def table_view(request):
     """
     current_user = request.user
     # tables with correct interests and university for user
-    tables = CafeTable.objects.filter(
-        university=current_user.university,
-        table_id__in=current_user.cafe_table_ids.values_list('table_id',
-                                                             flat=True)
-    )
+    tables = member_tables(current_user)
     context = {
         'tables': tables,
         'num_users': get_number_current_users()
@@ -236,25 +251,14 @@ def dashboard(request):
     """
     user = request.user
 
-    # the tables the user is part of
-    tables = CafeTable.objects.filter(
-        university=user.university,
-        table_id__in=user.cafe_table_ids.values_list('table_id',
-                                                     flat=True)
-    )
-
-    # Get last 10 notifications pertaining to the user
-    notifications = Notification.objects.filter(table_id__in=tables)[:9]
-    notifications = sorted(notifications, key=attrgetter("date"), reverse=True)
-    # format the times so they can be processed in JS for timezone conversion
-    for notif in notifications:
-        notif.date = pytz.utc.localize(notif.date).isoformat()
-
-    # 10 highest scoring students for the leaderboard
-    users = CoffeeUser.objects.filter(is_staff=False)
-    sorted_users = sorted(users, key=attrgetter("points"), reverse=True)
-    if len(sorted_users) > 10:
-        sorted_users = sorted_users[:9]
+    # newest notifications pertaining to the user, older ones are loaded
+    # from the feed as the user scrolls
+    notifications, newest = cached_notifications(user)
+    mark_read(user, newest)
+
+    # 10 highest scoring students for the leaderboard, and of the user's
+    # university over the last week and month
+    boards = cached_leaderboards(user.university)
 
     if user.is_staff is False:
         # setting study breaks feature
@@ -265,7 +269,10 @@ def dashboard(request):
                 break_time = datetime.datetime.now() + \
                     datetime.timedelta(minutes=mins)
                 user.studying_until = break_time
-                user.save()
+                CoffeeUser.objects.filter(pk=user.pk).update(
+                    studying_until=break_time)
+                # shown to the members of the user's tables
+                member_changed(user.pk)
 
         # Collectables:
 
@@ -291,25 +298,11 @@ def dashboard(request):
         # calculating how many points to reach next collectable
         points_to_go_next_collectable = int(how_much_to_go(points_level))
 
-        # Notification for points left
-        if (0 < points_to_go_next_collectable < 10):
-            n_text = user.first_name + " " + user.last_name + \
-                " has less than 10 points to go until their next collectable!"
-            notif = Notification(table_id=tables[0], notification_type=1,
-                                 text_preview=n_text)
-            notif.save()
+        # the student's position on the leaderboard
+        rank = cached_rank(user)
 
         # see if the student is currently studying
-        if user.studying_until:
-            if user.studying_until <= datetime.datetime.now():
-                # they are not studying anymore
-                user.studying_until = None
-                user.save()
-                studying = False
-            else:
-                studying = True
-        else:
-            studying = False
+        studying = is_studying(user)
 
     else:  # staff user - don't waste computation on irrelevant stuff
         link_img = ''
@@ -317,6 +310,7 @@ def dashboard(request):
         name_coffee = ''
         previous_collectables = []
         studying = False
+        rank = None
 
     # see if user can set tasks
     can_set_tasks = True
@@ -334,7 +328,10 @@ def dashboard(request):
         'university': user.get_university_display(),
         'dateJoined': tz_date,
         'points': user.points,
-        'users': sorted_users,
+        'users': boards['users'],
+        'weekly_users': boards['weekly_users'],
+        'monthly_users': boards['monthly_users'],
+        'rank': rank,
         'collectable': link_img,
         'pointsToGo': points_to_go_next_collectable,
         'nameCollectable': name_coffee,
@@ -346,7 +343,8 @@ def dashboard(request):
         'pk': user.pk,
         'staff': user.is_staff,
         'can_set_tasks': can_set_tasks,
-        'notifications': notifications,
+        'notifications': notifications['notifications'],
+        'more_notifications': notifications['more'],
     }
     return render(request, "dashboard.html", context)
 
@@ -371,16 +369,13 @@ def set_tasks(request):
     form = CreateTaskForm(user=request.user)
 
     # Users can only set tasks for tables they are part of
-    tables = CafeTable.objects.filter(
-        university=user.university,
-        table_id__in=user.cafe_table_ids.values_list('table_id', flat=True))
-    form.fields['table_id'].queryset = tables
+    form.fields['table_id'].queryset = member_tables(user)
 
     # reset number of tasks set today if necessary
     if user.tasks_set_today >= 2 and \
        user.next_possible_set == datetime.date.today():
         user.tasks_set_today = 0
-        user.save()
+        user.save(update_fields=['tasks_set_today'])
 
     # students can set max 2 tasks per day (to avoid spamming)
     if user.tasks_set_today >= 2 and not user.is_staff:
@@ -398,7 +393,7 @@ def set_tasks(request):
             points = form.cleaned_data.get('points')
             recurrence_interval = form.cleaned_data.get('recurrence_interval')
             max_repeats = form.cleaned_data.get('max_repeats')
-            Task.objects.create(  # removed task =
+            task = Task.objects.create(
                 task_name=task_name,
                 created_by=user,
                 table_id=table_id,
@@ -407,21 +402,25 @@ def set_tasks(request):
                 recurrence_interval=recurrence_interval,
                 max_repeats=max_repeats
             )
+            publish(table_id.pk, 'task', {
+                'id': task.id,
+                'task_name': task.task_name,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+            })
             user.tasks_set_today += 1
-            user.save()
+            user.save(update_fields=['tasks_set_today'])
 
             # Add notification
             task_text = user.first_name + user.last_name + " has added '" + \
                 task_name + "' as a new task - go check it out!"
-            notification = Notification(table_id=table_id, notification_type=3,
-                                        text_preview=task_text)
-            notification.save()
+            notify(table_id.pk, 3, 'set:%d' % task.pk, task_text)
 
             # if student, redirect if can't set more tasks now
             if user.tasks_set_today >= 2 and not user.is_staff:
                 user.next_possible_set = datetime.date.today() + \
                     datetime.timedelta(days=1)
-                user.save()
+                user.save(update_fields=['next_possible_set'])
                 return redirect("dashboard")
 
         else:
@@ -454,36 +453,23 @@ def view_tasks(request):
     if current_user.is_staff:
         return redirect("dashboard")
 
-    # get the tables the current user is part of
-    tables = CafeTable.objects.filter(
-        university=current_user.university,
-        table_id__in=current_user.cafe_table_ids.values_list('table_id',
-                                                             flat=True)
-    )
-
-    # check if any recurring tasks need to be set
-    check_recurring_tasks()
-
     # get the tasks corresponding to the user's tables that they haven't done
-    tasks = Task.objects.filter(table_id__in=tables).exclude(
-        completed_by=current_user).exclude(created_by=current_user)
+    # along with how many people completed them and can complete them
+    tasks = list(Task.objects.with_completion().select_related(None).filter(
+        table_id__in=member_table_ids(current_user)).exclude(
+            current_occurrence__completed_by=current_user).exclude(
+                created_by=current_user))
+    # their creators, from the members of the tables
+    creators = task_creators(tasks)
 
     # prepare number of people who completed a task and can complete a task
     # in format required by django html template
-    if tasks:
-        complete_current = []
-        complete_total = []
-        for task in tasks:
-            current, total = task.get_number_completed_task()
-            complete_current.append(current)
-            complete_total.append(total)
-        task_info = zip(tasks, complete_current, complete_total)
-    else:
-        task_info = []
+    task_info = [(task, creators.get(task.created_by_id),
+                  task.completed_count, task.eligible_count)
+                 for task in tasks]
 
     context = {
         'tasks': task_info,
-        'users': CoffeeUser.objects.all(),
         'num_users': get_number_current_users()
     }
     return render(request, 'view_tasks.html', context)
@@ -511,58 +497,18 @@ def complete_task(request, pk):
     # Get the task for which the button is pressed
     completed_task = Task.objects.get(pk=pk)
 
-    # reset number of student tasks completed if necessary
-    if current_user.student_tasks_completed >= 2 and \
-       current_user.next_possible_complete == datetime.date.today():
-        current_user.student_tasks_completed = 0
-        current_user.save()
-
-    # complete staff set task and earn points
-    if completed_task.created_by.is_staff:
-        # Add user to completed by field in database
-        completed_task.completed_by.add(current_user)
-        # Increment points field by respective amount
-        current_user.points += completed_task.points
-        current_user.save()
+    # complete the task and earn points, unless already completed or the
+    # user can't complete more student set tasks today
+    if not record_completion(current_user, completed_task):
+        return redirect('/view_tasks')
 
-    else:
-        # complete student set task and earn points if you can still complete
-        # student set tasks today and you did not create this task
-        if current_user.student_tasks_completed < 2 and not \
-           completed_task.created_by == current_user:
-            # Add user to completed by field in database
-            completed_task.completed_by.add(current_user)
-            # Increment points field by respective amount
-            current_user.points += completed_task.points
-            current_user.student_tasks_completed += 1
-            current_user.next_possible_complete = datetime.date.today() + \
-                datetime.timedelta(days=1)
-            current_user.save()
-
-    # bonus points if everyone (who can) completes the task
-    current, total = completed_task.get_number_completed_task()
-    if current == total:
-        completers = completed_task.completed_by.all()
-        for completer in completers:
-            completer.points += 2
-            completer.save()
-
-    # recurring tasks
-    if completed_task.recurrence_interval == "d":
-        completed_task.recurring_date = completed_task.date_set + \
-            datetime.timedelta(days=1)
-    elif completed_task.recurrence_interval == "w":
-        completed_task.recurring_date = completed_task.date_set + \
-            datetime.timedelta(weeks=1)
-    completed_task.save()
-
-    # Make a notification about the completed task
+    # Make a notification about the completed task, completions of the same
+    # task coalescing into one
     not_text = "Someone has completed the task '" + \
         str(completed_task.task_name) + "' and has earned " + \
         str(completed_task.points) + " points in doing so!"
-    notification = Notification(table_id=completed_task.table_id,
-                                notification_type=3, text_preview=not_text)
-    notification.save()
+    notify(completed_task.table_id_id, 3, 'completed:%d' % completed_task.pk,
+           not_text)
 
     return redirect('/view_tasks')
 
@@ -583,17 +529,11 @@ def table_chat(request, pk):
         render::HttpResponse
             Renders the 'table_chat.html' page
     """
-    # deal with if the requested table doesn't exist
-    try:
-        table = CafeTable.objects.get(pk=pk)
-    except CafeTable.DoesNotExist:
-        return render(request, 'denied.html')
-
-    # make sure user can only access their tables
+    # deal with if the requested table doesn't exist, making sure user can
+    # only access their tables
     current_user = request.user
-    if ((current_user.university != table.university) or
-       (table.table_id not in
-       current_user.cafe_table_ids.values_list('table_id', flat=True))):
+    table = table_for_user(current_user, pk)
+    if table is None:
         return render(request, 'denied.html')
 
     # if post req, use the form to add the msg
@@ -601,61 +541,41 @@ def table_chat(request, pk):
         form = PostMessageForm(request.POST)
         if form.is_valid():
             message_content = form.cleaned_data.get('message_content')
-            Message.objects.create(  # removed msg =
-                table_id=table,
-                created_by=current_user,
-                message_content=message_content,
-            )
+            post_message(current_user, table, message_content)
             form = PostMessageForm()
     else:
         form = PostMessageForm()
 
-    # show the existing messages by querying db
-    messages = Message.objects.filter(table_id=table).order_by(
-                'message_date')[:100]
-
+    # the messages themselves are fetched by the page once loaded
     # get the tasks for the table set today
-    check_recurring_tasks()
     date_from = datetime.date.today()
-    tasks = Task.objects.filter(table_id=table,
-                                date_set=date_from)
-
-    # get all the users in the table
-    users = table.coffeeuser_set.all()
-
-    # see if users are currently studying
-    users_studying = []
-    other_users = []
-    for user in users:
-        if user.studying_until:
-            # if the user set a time to study until
-            if user.studying_until <= datetime.datetime.now():
-                # they are not studying anymore
-                user.studying_until = None
-                user.save()
-                other_users.append(user)
-            else:
-                users_studying.append(user)
-        else:
-            other_users.append(user)
-    users_studying = sorted(users_studying, key=attrgetter("studying_until"),
-                            reverse=True)
+    tasks = list(Task.objects.filter(table_id=table,
+                                     date_set=date_from))
+    creators = task_creators(tasks)
+    tasks = [(task, creators.get(task.created_by_id)) for task in tasks]
+
+    # the members who earned the most points in the table this week
+    weekly_users = window_leaderboard(WEEK_DAYS, table=table)
+
+    # the users in the table, split on whether they are currently studying
+    users_studying, other_users = split_members(table)
 
     # final
     context = {
         "table": table,
         "form": form,
-        "messages": messages,
         "users_studying": users_studying,
         "other_users": other_users,
         "tasks": tasks,
-        'users': CoffeeUser.objects.all(),
+        "weekly_users": weekly_users,
         'num_users': get_number_current_users()
     }
     return render(request, "table_chat.html", context)
 
 
 # Alex 4/3/21
+@login_required(login_url='/')
+@require_POST
 def upvote(request, pk):
     """ Increases the upvote count for specific message when
         upvote button is clicked.
@@ -667,21 +587,49 @@ def upvote(request, pk):
     Returns:
         redirect::HttpResponse
             Redirects user to the 'table_chat.html' page and passes as a
-            parameter the table id for which the liked message is part of
+            parameter the table id for which the liked message is part of,
+            or renders 'denied.html' if the message doesn't exist or the
+            user isn't part of its table
     """
     current_user = request.user
-    message = Message.objects.get(id=pk)
+    try:
+        message = Message.objects.get(id=pk)
+    except Message.DoesNotExist:
+        return render(request, 'denied.html')
 
     # upvote the message if that user hasn't already
-    if current_user not in message.message_upvote.all():
-        message.message_upvote.add(current_user)
-        message.total_upvotes += 1
-        message.save()
+    if upvote_message(current_user, message) is None:
+        return render(request, 'denied.html')
 
-    current_table = message.table_id.id
+    current_table = message.table_id_id
     return redirect('table_chat', pk=current_table)
 
 
+# upvote without reloading the page
+@login_required(login_url='/')
+@require_POST
+def upvote_json(request, pk):
+    """ Upvotes a specific message for the chat page's scripts
+
+    Args:
+        request::HttpRequest
+            Object that contains metadata about the request
+        pk::int
+            The id of the upvoted message
+
+    Returns:
+        JsonResponse
+            The id of the message and its new upvote count
+    """
+    try:
+        message = Message.objects.get(id=pk)
+    except (Message.DoesNotExist, ValueError):
+        return JsonResponse({'status': 'not found'}, status=404)
+    if upvote_message(request.user, message) is None:
+        return JsonResponse({'status': 'denied'}, status=403)
+    return JsonResponse({'id': message.id, 'upvotes': message.total_upvotes})
+
+
 # will and izzy
 @login_required(login_url='/')
 def edit_info(request):
@@ -720,27 +668,20 @@ def edit_info(request):
                     old_course = user.course
                     # if already on a course, remove from old course table
                     old_table_name = "COURSE: " + old_course
-                    table = user.cafe_table_ids.get(
-                        table_id=old_table_name)
-                    user.cafe_table_ids.remove(table)
+                    user.cafe_table_ids.remove(*CafeTable.objects.filter(
+                        university=user.university, table_id=old_table_name))
 
                 new_course = form.cleaned_data['course'].lower()
                 user.course = new_course
                 # upper case throughout so not duplicates with different
                 # casing
                 new_course_table_name = "COURSE: " + new_course
-                # see if a table for this course exists
-                try:
-                    table = CafeTable.objects.get(
-                        university=user.university,
-                        table_id=new_course_table_name
-                    )
-                except CafeTable.DoesNotExist:
-                    # if that table does not exist, create it
-                    table = CafeTable.objects.create(
-                        table_id=new_course_table_name,
-                        university=user.university
-                    )
+                # find the table for this course, or create it if it doesn't
+                # exist, the unique index settling concurrent creations
+                table, _ = CafeTable.objects.get_or_create(
+                    university=user.university,
+                    table_id=new_course_table_name
+                )
                 # add the user to the table
                 user.cafe_table_ids.add(table)
 
@@ -748,31 +689,19 @@ def edit_info(request):
                 add_table_id = form.cleaned_data['add_table_id'].lower()
                 if not add_table_id.startswith("course:"):
                     # can't be sneaky and add urself to a course this way
-                    # see if table already exists
-                    try:
-                        table = CafeTable.objects.get(
-                            university=user.university,
-                            table_id=add_table_id
-                        )
-                    except CafeTable.DoesNotExist:
-                        # if that table does not exist, create it
-                        table = CafeTable.objects.create(
-                            table_id=add_table_id,
-                            university=user.university
-                        )
+                    # find the table, or create it if it doesn't exist
+                    table, _ = CafeTable.objects.get_or_create(
+                        university=user.university,
+                        table_id=add_table_id
+                    )
                     # add the user to the table
                     user.cafe_table_ids.add(table)
 
             if form.cleaned_data['remove_table_id']:
                 # if it is actually in their list of tables, remove
                 table_name_to_rm = form.cleaned_data['remove_table_id']
-                # make lower again
-                try:
-                    table = user.cafe_table_ids.get(
-                        table_id=table_name_to_rm)
-                    user.cafe_table_ids.remove(table)
-                except CafeTable.DoesNotExist:
-                    pass
+                user.cafe_table_ids.remove(*CafeTable.objects.filter(
+                    university=user.university, table_id=table_name_to_rm))
 
             if user.is_staff is False:
                 if form.cleaned_data['facebook_link']:
@@ -813,7 +742,9 @@ def edit_info(request):
                     if form.cleaned_data['year'] >= 1:
                         user.year = form.cleaned_data['year']
 
-            user.save()
+            # only the details edited here, as writing the whole row back
+            # would undo the points earned since the user was loaded
+            user.save(update_fields=EDITABLE_DETAILS)
 
     # load the correct form for students/staff
     if user.is_staff:
@@ -821,7 +752,7 @@ def edit_info(request):
     else:
         form = CUserEditForm()
 
-    tables = user.cafe_table_ids.values_list('table_id', flat=True)
+    tables = member_tables(user).values_list('table_id', flat=True)
     context = {
         'user': user,
         'form': form,
@@ -903,10 +834,7 @@ def reporting(request):
     user = request.user
     form = ReportForm()
     # users can only report issues for tables they are part of
-    tables = CafeTable.objects.filter(
-        university=user.university,
-        table_id__in=user.cafe_table_ids.values_list('table_id', flat=True))
-    form.fields['table_id'].queryset = tables
+    form.fields['table_id'].queryset = member_tables(user)
 
     context = {'form': form, 'num_users': get_number_current_users()}
     if request.method == 'POST':
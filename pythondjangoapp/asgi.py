@@ -0,0 +1,33 @@
+"""
+    ASGI config for the project.
+    It exposes the ASGI callable as a module-level variable named
+    ``application``. Requests that wait for changes in a table and the table
+    WebSockets are handled by the asynchronous consumers in app.routing,
+    everything else by Django.
+    For more information on this file, see
+    https://channels.readthedocs.io/en/stable/deploying.html
+    """
+
+import os
+
+from django.core.asgi import get_asgi_application
+from django.urls import re_path
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pythondjangoapp.settings")
+
+# set up Django before the consumers import any models
+django_application = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import \
+    AllowedHostsOriginValidator  # noqa: E402
+from app.routing import http_urlpatterns, websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': URLRouter(http_urlpatterns + [
+        re_path(r'', django_application),
+    ]),
+    'websocket': AllowedHostsOriginValidator(
+        URLRouter(websocket_urlpatterns)
+    ),
+})
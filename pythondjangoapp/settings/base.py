@@ -22,7 +22,8 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'livereload',
     'jquery',
-    'app',
+    'channels',
+    'app.apps.CoffeeCliqueConfig',
 ]
 
 MIDDLEWARE = [
@@ -32,6 +33,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middleware.PresenceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -49,6 +51,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app.context_processors.notifications',
             ]
         }
     }
@@ -58,6 +61,24 @@ AUTH_USER_MODEL = 'app.CoffeeUser'
 
 WSGI_APPLICATION = 'pythondjangoapp.wsgi.application'
 
+ASGI_APPLICATION = 'pythondjangoapp.asgi.application'
+
+# Table events are shared in-process by default, set REDIS_URL (e.g.
+# redis://localhost:6379) so that they reach every worker
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['REDIS_URL']]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -95,4 +116,35 @@ DATABASES = {
     }
 }
 
+# The default local memory cache is per process, point this at a shared
+# cache (e.g. memcached) when running several workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'coffeeclique',
+    },
+    # latest messages of each table, the least recently used tables are
+    # dropped once MAX_ENTRIES is reached
+    'messages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'coffeeclique-messages',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+# Several workers are run with REDIS_URL set, so the caches they must agree
+# on (versions, memberships and message buffers) are shared through Redis
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'KEY_PREFIX': 'coffeeclique',
+    }
+    # the least recently used tables are dropped by Redis' maxmemory policy
+    CACHES['messages'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'KEY_PREFIX': 'coffeeclique-messages',
+    }
+
 TIME_ZONE = 'UTC'